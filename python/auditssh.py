@@ -1,7 +1,15 @@
 # Module to audit SSH access on a specific host based on an external source of truth
+import argparse
+import base64
+import hashlib
 import json
 import os
 import re
+import shlex
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 
 import paramiko
 from onepass import OnePass
@@ -9,15 +17,22 @@ from onepass import OnePass
 # Constants
 SESSION = OnePass(session_token=os.environ['OP_TOKEN'])
 SSH = SESSION.get_password('SSH')
+WORKERS = 20   # hosts audited at once in fleet mode
+HOME_MARKER = '==> '
+MISSING_MARKER = '!missing'
+UNREADABLE_MARKER = '!unreadable'
+KEEPALIVE = 30    # seconds between keep-alive packets of pooled connections
+MAX_IDLE = 1800   # seconds before an unused pooled connection is closed
+SSH_PORT = 22
 
 
 class MySSHClient:
 
     # Create a SSH client
-    def __init__(self, hostname, username, privateKeyFilename, password):
+    def __init__(self, hostname, username, privateKeyFilename, password, port=SSH_PORT):
         self.client = paramiko.SSHClient()
         self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.client.connect(hostname, username=username, key_filename=privateKeyFilename, password=password)
+        self.client.connect(hostname, port=port, username=username, key_filename=privateKeyFilename, password=password)
 
     # Run arbitrary command on remote host
     def command(self, command):
@@ -34,11 +49,76 @@ class MySSHClient:
         del self.stdin, self.stdout, self.stderr
         return usersList
 
+    # Check the underlying transport is still usable
+    def is_active(self):
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    # Read every authorized_keys file under /home and of the extra homes in one remote command
+    def authorized_keys(self, homes=()):
+        stdin, stdout, stderr = self.client.exec_command(collector(homes))
+        return parse_authorized_keys(stdout.read().decode('utf-8'))
+
     def closeConnection(self):
         if(self.client != None):
             self.client.close()
 
 
+class LocalClient:
+
+    # Hosts with ansible_connection=local are audited without SSH, like ansible does
+    def authorized_keys(self, homes=()):
+        output = subprocess.run(['sh', '-c', collector(homes)], stdout=subprocess.PIPE).stdout
+        return parse_authorized_keys(output.decode('utf-8'))
+
+
+class SSHPool:
+
+    # Pool of SSH clients keyed by host and user, every command of a host shares one transport
+    def __init__(self, password, keepalive=KEEPALIVE, maxIdle=MAX_IDLE):
+        self.password = password
+        self.keepalive = keepalive
+        self.maxIdle = maxIdle
+        self.clients = {}
+        self.lock = Lock()
+
+    # Reuse the connection of a host/port/user or open a new one
+    def get(self, hostname, username, privateKeyFilename, port=SSH_PORT):
+        key = (hostname, port, username)
+
+        with self.lock:
+            entry = self.clients.get(key)
+            if entry and entry[0].is_active():
+                entry[1] = time.monotonic()
+                return entry[0]
+
+        client = MySSHClient(hostname, username, privateKeyFilename, self.password, port)
+        client.client.get_transport().set_keepalive(self.keepalive)
+
+        with self.lock:
+            if entry:
+                entry[0].closeConnection()
+            self.clients[key] = [client, time.monotonic()]
+
+        return client
+
+    # Close the connections unused for more than maxIdle seconds or already dropped
+    def evict_idle(self):
+        now = time.monotonic()
+
+        with self.lock:
+            for key, (client, lastUsed) in list(self.clients.items()):
+                if now - lastUsed > self.maxIdle or not client.is_active():
+                    client.closeConnection()
+                    del self.clients[key]
+
+    def close(self):
+        with self.lock:
+            for client, lastUsed in self.clients.values():
+                client.closeConnection()
+            self.clients.clear()
+
+
 #  Function
 def report(title, data):
     print('{:_^45}'.format(''))
@@ -47,72 +127,222 @@ def report(title, data):
     print(json.dumps(data, indent=4))
 
 
-# External source of truth
-host = {'users': ['user1', 'user2', 'user7'],
-        'roles': {'role1': {'id': ['user1', 'user3'],
-                            'home': '/var/lib/role1'},
-                  'role2': {'id': ['user2', 'user3', 'user4']}}}
+# Shell command printing every authorized_keys file under /home and of the extra homes, each after a home marker.
+# An empty line follows every file, so a file without a trailing newline does not run into the next marker.
+# A missing file and a file the audit user cannot read get their own markers.
+def collector(homes=()):
+    return ('for home in /home/* {}; do [ -d "$home" ] || continue; echo "{}$home"; keys="$home/.ssh/authorized_keys"; '
+            'if [ ! -e "$keys" ]; then echo "{}"; elif cat "$keys" 2>/dev/null; then echo; else echo "{}"; fi; done').format(
+        ' '.join(shlex.quote(home) for home in homes), HOME_MARKER, MISSING_MARKER, UNREADABLE_MARKER)
+
+
+# OpenSSH SHA256 fingerprint of a base64 encoded public key
+def key_fingerprint(key):
+    digest = hashlib.sha256(base64.b64decode(key)).digest()
+    return 'SHA256:' + base64.b64encode(digest).decode('utf-8').rstrip('=')
+
+
+# Parse the collector output as {home: [keys]}, None when the home has no authorized_keys file
+# and UNREADABLE_MARKER when the file cannot be read
+def parse_authorized_keys(output):
+    homes = {}
+    home = None
+
+    # A marker glued to the last line of a file without a trailing newline starts its own line
+    lines = []
+    for line in output.splitlines():
+        key, marker, markedHome = line.partition(HOME_MARKER)
+        lines.extend([key, marker + markedHome] if marker else [line])
+
+    for line in lines:
+        line = line.strip()
+
+        if line.startswith(HOME_MARKER):
+            home = line[len(HOME_MARKER):]
+            homes.update({home: []})
+
+        elif line == MISSING_MARKER:
+            homes.update({home: None})
+
+        elif line == UNREADABLE_MARKER:
+            homes.update({home: UNREADABLE_MARKER})
+
+        elif line and not line.startswith('#') and home is not None:
+            fields = line.split()
+
+            # Skip the key options, if any, up to the key type
+            types = [index for index, field in enumerate(fields) if re.match('(ssh|ecdsa|sk)-', field)]
+            if not types or len(fields) <= types[0] + 1:
+                continue
+            keyType, key = fields[types[0]:types[0] + 2]
+            comment = ' '.join(fields[types[0] + 2:])
+
+            try:
+                fingerprint = key_fingerprint(key)
+            except ValueError:
+                fingerprint = None
 
-report('Source of truth', host)
+            homes[home].append({'user': re.sub('@[a-z]{1,20}\.[a-z]{1,10}', '', comment.split(' ')[0]),
+                                'type': keyType,
+                                'fingerprint': fingerprint,
+                                'comment': comment})
 
-# Instantiation
-authkeys = MySSHClient('IP address', 'username', 'pathToPrivateKey', SSH)   # update the IP address, username and pathToPrivateKey
-sourceTruthOnly = {'users': [], 'roles': []}
-hostUsersOnly = {'users': authkeys.stdout_list(authkeys.command('ls /home')), 'roles': {}}
+    return homes
 
-# Search remote host for users under /home
-for user in host['users']:
-    userOutput = authkeys.command('grep -E "([a-z]{1,30}|\.){1,7}" /home/%s/.ssh/authorized_keys | cut -d" " -f3' % user)
 
-    if 'No such file or directory' in userOutput:
-        sourceTruthOnly['users'].append(user)
+# Read the hosts of an ansible INI inventory, optionally limited to one group
+def inventory_hosts(path, group=None):
+    hosts = {}
+    section = None
 
-    else:
-        hostUsersOnly['users'].remove(user)
+    with open(path) as inventory:
+        for line in inventory:
+            line = re.split('[#;]', line)[0].strip()
 
-# Search remote host for role users
-for role, roleData in host['roles'].items():
+            if not line:
+                continue
 
-    # Search remote host for role users under /home
-    if not 'home' in roleData:
-        roleOutput = authkeys.command('grep -E "([a-z]{1,30}|\.){1,7}" /home/%s/.ssh/authorized_keys | cut -d" " -f3' % role)
+            if line.startswith('['):
+                section = line.strip('[]')
+                continue
 
-        if 'No such file or directory' in roleOutput:
+            # Skip [group:vars] and [group:children] sections
+            if (section and ':' in section) or (group and section != group):
+                continue
+
+            fields = line.split()
+            hostVars = dict(field.split('=', 1) for field in fields[1:] if '=' in field)
+            hosts.update({fields[0]: {'address': hostVars.get('ansible_host', fields[0]),
+                                      'port': int(hostVars.get('ansible_port', hostVars.get('ansible_ssh_port', SSH_PORT))),
+                                      'user': hostVars.get('ansible_user'),
+                                      'connection': hostVars.get('ansible_connection', 'ssh')}})
+
+    return hosts
+
+
+# Compare the authorized_keys of a host with the source of truth.
+# Homes whose authorized_keys cannot be read are returned apart, they are not drift.
+def audit_host(authkeys, host):
+    homes = [roleData['home'] for roleData in host['roles'].values() if 'home' in roleData]
+    keys = authkeys.authorized_keys(homes)
+    unreadable = [home for home, homeKeys in keys.items() if homeKeys == UNREADABLE_MARKER]
+
+    sourceTruthOnly = {'users': [], 'roles': []}
+    hostUsersOnly = {'users': [os.path.basename(home) for home in keys if os.path.dirname(home) == '/home'], 'roles': {}}
+
+    # Search remote host for users under /home
+    for user in host['users']:
+
+        if '/home/%s' % user in unreadable:
+            hostUsersOnly['users'].remove(user)
+
+        elif keys.get('/home/%s' % user) is None:
+            sourceTruthOnly['users'].append(user)
+
+        else:
+            hostUsersOnly['users'].remove(user)
+
+    # Search remote host for role users, under /home or with a custom $HOME
+    for role, roleData in host['roles'].items():
+        home = roleData.get('home', '/home/%s' % role)
+
+        if home in unreadable:
+            if not 'home' in roleData:
+                hostUsersOnly['users'].remove(role)
+
+        elif keys.get(home) is None:
             sourceTruthOnly['roles'].append(role)
 
         else:
-            hostUsersOnly['users'].remove(role)
+            if not 'home' in roleData:
+                hostUsersOnly['users'].remove(role)
             hostUsersOnly['roles'].update({role: []})
-            serverAccess = authkeys.stdout_list(roleOutput)
 
-            for user in serverAccess:
+            for key in keys[home]:
 
-                if not user in roleData['id']:
-                    hostUsersOnly['roles'][role].append(user)
-                else:
-                    pass
+                if not key['user'] in roleData['id']:
+                    hostUsersOnly['roles'][role].append(key['user'])
 
-    # Search remote host for role users with a custom $HOME
-    if 'home' in roleData:
-        home = roleData['home']
-        roleHomeOutput = authkeys.command('grep -E "([a-z]{1,30}|\.){1,7}" %s/.ssh/authorized_keys | cut -d" " -f3' % home)
+    return sourceTruthOnly, hostUsersOnly, unreadable
 
-        if 'No such file or directory' in roleHomeOutput:
-            sourceTruthOnly.append(user)
 
-        else:
-            hostUsersOnly['roles'].update({role: []})
-            serverAccess = authkeys.stdout_list(roleHomeOutput)
+# Audit every host of the fleet on a bounded pool of SSH connections
+def audit_fleet(hosts, source, username, privateKeyFilename, pool, workers=WORKERS):
+
+    def audit(hostname):
+        target = hosts[hostname]
+        try:
+            if target['connection'] == 'local':
+                authkeys = LocalClient()
+            else:
+                authkeys = pool.get(target['address'], target['user'] or username, privateKeyFilename, target['port'])
+            sourceTruthOnly, hostUsersOnly, unreadable = audit_host(authkeys, source)
+            result = {'sourceTruthOnly': sourceTruthOnly, 'hostUsersOnly': hostUsersOnly}
+            if unreadable:
+                result.update({'error': 'unreadable authorized_keys in ' + ', '.join(unreadable)})
+            return result
+        except Exception as error:
+            return {'error': str(error)}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(hosts, executor.map(audit, hosts)))
+
+
+# External source of truth
+host = {'users': ['user1', 'user2', 'user7'],
+        'roles': {'role1': {'id': ['user1', 'user3'],
+                            'home': '/var/lib/role1'},
+                  'role2': {'id': ['user2', 'user3', 'user4']}}}
+
+
+# Instantiate argument parser
+def get_args():
+    parser = argparse.ArgumentParser(prog='auditssh',
+                                     usage='%(prog)s [-i inventory [-g group]] [-H host [-p port]] -u username -k pathToPrivateKey',
+                                     description='auditssh is a Python 3 script that compares the authorized_keys of one host, or of a fleet of hosts from an ansible inventory, with a source of truth.')
+    parser.add_argument('-H', '--host', action='store', default='IP address', help='host to audit')
+    parser.add_argument('-i', '--inventory', action='store', help='ansible INI inventory of the hosts to audit')
+    parser.add_argument('-g', '--group', action='store', help='only audit the hosts of this inventory group')
+    parser.add_argument('-p', '--port', action='store', type=int, default=SSH_PORT, help='SSH port of the host')
+    parser.add_argument('-u', '--username', action='store', default='username', help='SSH username')
+    parser.add_argument('-k', '--key', action='store', default='pathToPrivateKey', help='SSH private key file')
+    parser.add_argument('-w', '--workers', action='store', type=int, default=WORKERS, help='hosts audited at once')
+    parser.add_argument('--interval', action='store', type=int, help='repeat the audit every INTERVAL minutes, reusing the SSH connections')
+
+    return parser.parse_args()
+
+
+def main(args):
+
+    report('Source of truth', host)
+    pool = SSHPool(SSH)
+
+    try:
+        while True:
+            if args.inventory:
+                fleet = audit_fleet(inventory_hosts(args.inventory, args.group), host, args.username, args.key, pool, args.workers)
+                report('Fleet drift per host', fleet)
+
+            else:
+                authkeys = pool.get(args.host, args.username, args.key, args.port)
+                sourceTruthOnly, hostUsersOnly, unreadable = audit_host(authkeys, host)
+
+                # Print report
+                report('Users only included in the source of truth', sourceTruthOnly)
+                report('Users only seen on remote host', hostUsersOnly)
+                if unreadable:
+                    report('Error: unreadable authorized_keys', unreadable)
 
-            for user in serverAccess:
+            if not args.interval:
+                break
 
-                if not user in roleData['id']:
-                    hostUsersOnly['roles'][role].append(user)
-                else:
-                    pass
+            # Close the connections left idle or dropped during the sleep before the next round
+            time.sleep(args.interval * 60)
+            pool.evict_idle()
+    finally:
+        pool.close()
 
-authkeys.closeConnection()
 
-# Print report
-report('Users only included in the source of truth', sourceTruthOnly)
-report('Users only seen on remote host', hostUsersOnly)
+if __name__ == '__main__':
+    args = get_args()
+    main(args)
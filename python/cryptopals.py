@@ -1,5 +1,37 @@
 # Module to centralize Cryptopals Crypto Challenge functions
 from base64 import b64decode, b64encode
+from binascii import a2b_base64, b2a_base64, hexlify, unhexlify
+from collections import Counter
+from multiprocessing import Pool
+
+# Translation tables XORing every byte with a key byte, XOR_TABLES[key]
+XOR_TABLES = [bytes(byte ^ key for byte in range(256)) for key in range(256)]
+
+# English letter frequencies (%) used to score candidate plaintexts
+ENGLISH_FREQUENCY = {
+    'a': 8.2, 'b': 1.5, 'c': 2.8, 'd': 4.3, 'e': 12.7, 'f': 2.2, 'g': 2.0, 'h': 6.1, 'i': 7.0,
+    'j': 0.15, 'k': 0.77, 'l': 4.0, 'm': 2.4, 'n': 6.7, 'o': 7.5, 'p': 1.9, 'q': 0.095, 'r': 6.0,
+    's': 6.3, 't': 9.1, 'u': 2.8, 'v': 0.98, 'w': 2.4, 'x': 0.15, 'y': 2.0, 'z': 0.074, ' ': 13.0
+}
+
+
+# Score of every byte value: letter frequency, small bonus for printable text, penalty for the rest
+def byte_scores():
+    scores = []
+    for byte in range(256):
+        char = chr(byte).lower()
+        if char in ENGLISH_FREQUENCY:
+            scores.append(ENGLISH_FREQUENCY[char])
+        elif 32 <= byte < 127 or byte in (9, 10, 13):
+            scores.append(0.5)
+        else:
+            scores.append(-10.0)
+    return scores
+
+
+BYTE_SCORES = byte_scores()
+CHUNK_SIZE = 1 << 20    # bytes read at once by the streaming helpers
+WHITESPACE = b' \t\r\n'
 
 
 class Cryptopals:
@@ -7,21 +39,21 @@ class Cryptopals:
     def __init__(self):
         self.description = "Cryptopals Crypto Challenge Functions"
 
-    def char_frequency(str):
-        freq = {}
-        for c in set(str):
-            freq[c] = str.count(c)
-        return freq
+    def char_frequency(self, str):
+        return dict(Counter(str))
 
 
     def highest_frequency(self, str):
         freq = self.char_frequency(str)
-        max_value = max(list(freq.values()))
-        return list(freq.keys())[list(freq.values()).index(max_value)]
+        return max(freq, key=freq.get)
 
 
     def hex_to_byte(self, hexstr):
-        return bytes.fromhex(hex_string)
+        return bytes.fromhex(hexstr)
+
+
+    def byte_to_hex(self, data):
+        return data.hex()
 
 
     def hex_to_base64(self, hexstr):
@@ -32,14 +64,157 @@ class Cryptopals:
         return b64decode(b64str.encode()).hex()
 
 
+    def xor_bytes(self, a, b):
+        # XOR as one big integer operation, truncated to the shortest input like zip()
+        length = min(len(a), len(b))
+        a = int.from_bytes(a[:length], 'big')
+        b = int.from_bytes(b[:length], 'big')
+        return (a ^ b).to_bytes(length, 'big')
+
+
     def xor_strings(self, s, t):
-        sb = bytes.fromhex(s)
-        tb = bytes.fromhex(t)
-        return bytes([a ^ b for a, b in zip(sb, tb)]).hex()
+        return self.xor_bytes(bytes.fromhex(s), bytes.fromhex(t)).hex()
 
 
     def single_char_xor(self, input, char):
-        output = b''
-        for byte in input:
-            output += bytes([byte ^ char])
-        return output, char
+        return bytes(input).translate(XOR_TABLES[char]), char
+
+
+    def repeating_key_xor(self, input, key):
+        keystream = key * (len(input) // len(key) + 1)
+        return self.xor_bytes(input, keystream[:len(input)])
+
+
+    def hamming_distance(self, a, b):
+        length = min(len(a), len(b))
+        return (int.from_bytes(a[:length], 'big') ^ int.from_bytes(b[:length], 'big')).bit_count()
+
+
+    def score_keys(self, input):
+        # Score the 256 single-byte keys from one byte count of the input: a key score is the
+        # sum of the byte scores of the plaintext, i.e. count(byte) * score(byte ^ key)
+        counts = Counter(input).items()
+        scores = [(sum(count * BYTE_SCORES[byte ^ key] for byte, count in counts), key) for key in range(256)]
+        return sorted(scores, reverse=True)
+
+
+    def crack_single_char_xor(self, input, top=1):
+        # Best keys first, as (score, key, plaintext) tuples
+        return [(score, key, self.single_char_xor(input, key)[0]) for score, key in self.score_keys(input)[:top]]
+
+
+    def best_single_char_xor(self, input):
+        score, key = self.score_keys(input)[0]
+        return score, key
+
+
+    def detect_single_char_xor(self, ciphertexts, processes=None):
+        # Find the ciphertext encrypted with a single-byte XOR, candidates scored across a process pool.
+        # Returns (score, index, key, plaintext) of the best candidate.
+        ciphertexts = list(ciphertexts)
+        if not ciphertexts:
+            raise ValueError('no ciphertext to check')
+        with Pool(processes=processes) as pool:
+            best = pool.map(self.best_single_char_xor, ciphertexts, chunksize=max(1, len(ciphertexts) // 64))
+        score, index, key = max((score, index, key) for index, (score, key) in enumerate(best))
+        return score, index, key, self.single_char_xor(ciphertexts[index], key)[0]
+
+
+    def key_sizes(self, input, min_size=2, max_size=40, blocks=4):
+        # Repeating-key sizes ranked by the normalized Hamming distance of their first blocks
+        distances = []
+        for size in range(min_size, min(max_size, len(input) // 2) + 1):
+            chunks = [input[i * size:(i + 1) * size] for i in range(min(blocks, len(input) // size))]
+            pairs = list(zip(chunks, chunks[1:]))
+            distance = sum(self.hamming_distance(a, b) for a, b in pairs) / len(pairs) / size
+            distances.append((distance, size))
+        return [size for distance, size in sorted(distances)]
+
+
+    def crack_repeating_key_xor(self, input, candidates=3):
+        # Try the best key sizes, crack every column as a single-byte XOR and keep the best plaintext.
+        # Returns (key, plaintext).
+        best = None
+        for size in self.key_sizes(input)[:candidates]:
+            key = bytes(self.best_single_char_xor(input[column::size])[1] for column in range(size))
+
+            # A multiple of the key size finds the key repeated, keep its shortest period
+            key = next(key[:period] for period in range(1, size + 1)
+                       if size % period == 0 and key[:period] * (size // period) == key)
+            plaintext = self.repeating_key_xor(input, key)
+            score = sum(BYTE_SCORES[byte] * count for byte, count in Counter(plaintext).items()) / len(plaintext)
+            if best is None or score > best[0]:
+                best = (score, key, plaintext)
+        if best is None:
+            raise ValueError('input too short to guess a key size, at least 4 bytes are needed')
+        return best[1], best[2]
+
+
+    def read_chunks(self, file, size=CHUNK_SIZE):
+        # Read a binary file into one reused buffer, every chunk is a memoryview valid until the next one
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        while True:
+            length = file.readinto(buffer)
+            if not length:
+                break
+            yield view[:length]
+
+
+    def aligned_chunks(self, chunks, block):
+        # Re-slice chunks on block boundaries, only the bytes straddling two chunks are copied
+        carry = b''
+        for chunk in chunks:
+            view = memoryview(chunk)
+            if carry:
+                need = block - len(carry)
+                carry += bytes(view[:need])
+                view = view[need:]
+                if len(carry) < block:
+                    continue
+                yield carry
+                carry = b''
+            usable = len(view) - len(view) % block
+            if usable:
+                yield view[:usable]
+            carry = bytes(view[usable:])
+        if carry:
+            yield carry
+
+
+    def text_chunks(self, chunks):
+        # ASCII bytes of str or bytes chunks, whitespace and line breaks removed
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('ascii')
+            yield bytes(chunk).translate(None, WHITESPACE)
+
+
+    def hex_to_byte_stream(self, chunks):
+        for chunk in self.aligned_chunks(self.text_chunks(chunks), 2):
+            yield unhexlify(chunk)
+
+
+    def byte_to_hex_stream(self, chunks):
+        for chunk in chunks:
+            yield hexlify(chunk)
+
+
+    def byte_to_base64_stream(self, chunks):
+        for chunk in self.aligned_chunks(chunks, 3):
+            yield b2a_base64(chunk, newline=False)
+
+
+    def base64_to_byte_stream(self, chunks):
+        for chunk in self.aligned_chunks(self.text_chunks(chunks), 4):
+            yield a2b_base64(chunk)
+
+
+    def xor_stream(self, chunks, key):
+        # Repeating-key XOR over chunks, the key position carries over from one chunk to the next
+        offset = 0
+        for chunk in chunks:
+            start = offset % len(key)
+            keystream = key[start:] + key * ((len(chunk) + start) // len(key) + 1)
+            yield self.xor_bytes(chunk, keystream[:len(chunk)])
+            offset += len(chunk)
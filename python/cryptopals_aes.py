@@ -0,0 +1,113 @@
+# Module of AES primitives and ECB detection for the Cryptopals Crypto Challenge
+import argparse
+import os
+import time
+from multiprocessing import Pool
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptopals import Cryptopals
+
+# Constants
+BLOCK_SIZE = 16
+CRYPTOPALS = Cryptopals()
+
+
+def blocks(data, size=BLOCK_SIZE):
+    # Split data in memoryview blocks, nothing is copied
+    view = memoryview(data)
+    return [view[i:i + size] for i in range(0, len(view), size)]
+
+
+def pkcs7_pad(data, size=BLOCK_SIZE):
+    padding = size - len(data) % size
+    return bytes(data) + bytes([padding]) * padding
+
+
+def pkcs7_unpad(data, size=BLOCK_SIZE):
+    if not data or len(data) % size:
+        raise ValueError("Invalid PKCS#7 padded length")
+
+    padding = data[-1]
+    if not 1 <= padding <= size or data[-padding:] != bytes([padding]) * padding:
+        raise ValueError("Invalid PKCS#7 padding")
+
+    return bytes(data[:-padding])
+
+
+def aes_ecb_encrypt(key, data):
+    encryptor = Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+    return encryptor.update(data) + encryptor.finalize()
+
+
+def aes_ecb_decrypt(key, data):
+    decryptor = Cipher(algorithms.AES(key), modes.ECB()).decryptor()
+    return decryptor.update(data) + decryptor.finalize()
+
+
+def aes_cbc_encrypt(key, iv, data):
+    # CBC built on top of ECB, every block depends on the previous ciphertext block
+    encryptor = Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+    previous = iv
+    ciphertext = bytearray()
+
+    for block in blocks(pkcs7_pad(data)):
+        previous = encryptor.update(CRYPTOPALS.xor_bytes(block, previous))
+        ciphertext += previous
+
+    return bytes(ciphertext)
+
+
+def aes_cbc_decrypt(key, iv, data):
+    # Decrypt every block in one ECB call, then XOR with the IV and the previous ciphertext blocks at once
+    decrypted = aes_ecb_decrypt(key, data)
+    previous = bytes(iv) + bytes(memoryview(data)[:-BLOCK_SIZE])
+    return pkcs7_unpad(CRYPTOPALS.xor_bytes(decrypted, previous))
+
+
+def repeated_blocks(ciphertext):
+    # Number of repeated 16-byte blocks, in one pass hashing the blocks into a set
+    ciphertext_blocks = blocks(bytes(ciphertext))
+    return len(ciphertext_blocks) - len(set(ciphertext_blocks))
+
+
+def is_ecb(ciphertext):
+    return repeated_blocks(ciphertext) > 0
+
+
+def detect_ecb(ciphertexts, processes=None):
+    # Indexes of the ciphertexts with repeated blocks, most repeated first, scanned across a process pool
+    ciphertexts = list(ciphertexts)
+    with Pool(processes=processes) as pool:
+        repeats = pool.map(repeated_blocks, ciphertexts, chunksize=max(1, len(ciphertexts) // 64))
+    return sorted((index for index, count in enumerate(repeats) if count), key=lambda index: -repeats[index])
+
+
+def benchmark(sizes=(1000, 10000, 100000), length=160, processes=None):
+    # ECB detection throughput over growing corpora, a linear scan keeps the ns/byte flat
+    print('{:>10} {:>10} {:>10} {:>10}'.format('corpus', 'MB', 'seconds', 'ns/byte'))
+
+    for size in sizes:
+        corpus = [os.urandom(length) for _ in range(size)]
+        corpus[size // 2] = os.urandom(BLOCK_SIZE) * (length // BLOCK_SIZE)
+
+        start = time.perf_counter()
+        found = detect_ecb(corpus, processes)
+        elapsed = time.perf_counter() - start
+
+        assert found == [size // 2]
+        print('{:>10} {:>10.1f} {:>10.3f} {:>10.2f}'.format(size, size * length / 1e6, elapsed, elapsed * 1e9 / (size * length)))
+
+
+def get_args():
+    parser = argparse.ArgumentParser(prog="cryptopals_aes",
+                                     description="Benchmark the ECB detection over growing corpora of random ciphertexts")
+    parser.add_argument('--sizes', action='store', default='1000,10000,100000', help='comma separated corpus sizes')
+    parser.add_argument('--length', action='store', type=int, default=160, help='ciphertext length in bytes')
+    parser.add_argument('--processes', action='store', type=int, help='processes of the detection pool [Default: CPU count]')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    benchmark([int(size) for size in args.sizes.split(',')], args.length, args.processes)
@@ -0,0 +1,138 @@
+# Module to benchmark the Cryptopals hot paths and catch performance regressions against a baseline
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from base64 import b64encode
+
+from cryptopals import Cryptopals
+
+# Constants
+SIZES = (1 << 10, 1 << 16, 1 << 20, 1 << 24, 1 << 26)    # 1 KB to 64 MB
+THRESHOLD = 0.25    # slowdown ratio above the baseline considered a regression
+REPEAT = 3          # runs of every case, the fastest one is kept
+MIN_TIME = 0.2      # seconds a measure lasts at least, small inputs run several times
+KEY = b'Terminator X'
+LINE_LENGTH = 60    # ciphertext length of the detect_single_char_xor corpus
+CRYPTOPALS = Cryptopals()
+TEXT = (b"Now that the party is jumping, with the bass kicked in and the Vega's are pumpin. "
+        b"Quick to the point, to the point, no faking. Cooking MC's like a pound of bacon. ")
+
+
+# Inputs of a given size, built once per size and shared by every case
+def inputs(size):
+    text = (TEXT * (size // len(TEXT) + 1))[:size]
+    data = os.urandom(size)
+    cipher = CRYPTOPALS.repeating_key_xor(text, KEY)
+    lines = [data[i:i + LINE_LENGTH] for i in range(0, size, LINE_LENGTH)]
+    lines[len(lines) // 2] = CRYPTOPALS.single_char_xor(text[:LINE_LENGTH], 53)[0]
+    return {'string': text.decode('latin-1'),
+            'data': data,
+            'other': os.urandom(size),
+            'cipher': cipher,
+            'hex': data.hex(),
+            'base64': b64encode(data).decode(),
+            'lines': lines}
+
+
+CASES = {
+    'char_frequency': lambda i: CRYPTOPALS.char_frequency(i['string']),
+    'highest_frequency': lambda i: CRYPTOPALS.highest_frequency(i['string']),
+    'hex_to_byte': lambda i: CRYPTOPALS.hex_to_byte(i['hex']),
+    'byte_to_hex': lambda i: CRYPTOPALS.byte_to_hex(i['data']),
+    'hex_to_base64': lambda i: CRYPTOPALS.hex_to_base64(i['hex']),
+    'base64_to_hex': lambda i: CRYPTOPALS.base64_to_hex(i['base64']),
+    'xor_bytes': lambda i: CRYPTOPALS.xor_bytes(i['data'], i['other']),
+    'xor_strings': lambda i: CRYPTOPALS.xor_strings(i['hex'], i['hex']),
+    'single_char_xor': lambda i: CRYPTOPALS.single_char_xor(i['data'], 53),
+    'repeating_key_xor': lambda i: CRYPTOPALS.repeating_key_xor(i['data'], KEY),
+    'hamming_distance': lambda i: CRYPTOPALS.hamming_distance(i['data'], i['other']),
+    'score_keys': lambda i: CRYPTOPALS.score_keys(i['cipher']),
+    'crack_single_char_xor': lambda i: CRYPTOPALS.crack_single_char_xor(i['cipher'], top=3),
+    'detect_single_char_xor': lambda i: CRYPTOPALS.detect_single_char_xor(i['lines']),
+    'key_sizes': lambda i: CRYPTOPALS.key_sizes(i['cipher']),
+    'crack_repeating_key_xor': lambda i: CRYPTOPALS.crack_repeating_key_xor(i['cipher']),
+    'hex_to_byte_stream': lambda i: sum(len(chunk) for chunk in CRYPTOPALS.hex_to_byte_stream([i['hex']])),
+    'byte_to_hex_stream': lambda i: sum(len(chunk) for chunk in CRYPTOPALS.byte_to_hex_stream(CRYPTOPALS.read_chunks(io.BytesIO(i['data'])))),
+    'byte_to_base64_stream': lambda i: sum(len(chunk) for chunk in CRYPTOPALS.byte_to_base64_stream(CRYPTOPALS.read_chunks(io.BytesIO(i['data'])))),
+    'base64_to_byte_stream': lambda i: sum(len(chunk) for chunk in CRYPTOPALS.base64_to_byte_stream([i['base64']])),
+    'xor_stream': lambda i: sum(len(chunk) for chunk in CRYPTOPALS.xor_stream(CRYPTOPALS.read_chunks(io.BytesIO(i['data'])), KEY)),
+}
+
+
+# Fastest run time of a case in seconds, small inputs are looped to last at least MIN_TIME
+def measure(case, data):
+    best = None
+    for _ in range(REPEAT):
+        loops = 0
+        start = time.perf_counter()
+        while True:
+            case(data)
+            loops += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_TIME:
+                break
+        if best is None or elapsed / loops < best:
+            best = elapsed / loops
+    return best
+
+
+def run(sizes, cases):
+    results = {name: {} for name in cases}
+    print('{:<26} {:>10} {:>12} {:>10}'.format('case', 'size', 'seconds', 'MB/s'))
+
+    for size in sizes:
+        data = inputs(size)
+        for name in cases:
+            seconds = measure(CASES[name], data)
+            results[name][str(size)] = seconds
+            print('{:<26} {:>10} {:>12.6f} {:>10.1f}'.format(name, size, seconds, size / seconds / 1e6))
+
+    return results
+
+
+# Cases slower than the baseline by more than the threshold, as (case, size, baseline, current)
+def regressions(results, baseline, threshold=THRESHOLD):
+    slower = []
+    for name, sizes in results.items():
+        for size, seconds in sizes.items():
+            reference = baseline.get(name, {}).get(size)
+            if reference and seconds > reference * (1 + threshold):
+                slower.append((name, size, reference, seconds))
+    return slower
+
+
+def get_args():
+    parser = argparse.ArgumentParser(prog="cryptopals_bench",
+                                     description="Benchmark the Cryptopals methods from 1 KB to 64 MB inputs and compare with a baseline")
+    parser.add_argument('--sizes', action='store', default=','.join(str(size) for size in SIZES), help='comma separated input sizes in bytes')
+    parser.add_argument('--cases', action='store', default=','.join(CASES), help='comma separated cases [Default: all]')
+    parser.add_argument('--save', action='store', help='save the results as the baseline JSON file')
+    parser.add_argument('--baseline', action='store', help='baseline JSON file to compare with')
+    parser.add_argument('--threshold', action='store', type=float, default=THRESHOLD, help='tolerated slowdown ratio [Default {}]'.format(THRESHOLD))
+
+    return parser.parse_args()
+
+
+def main(args):
+    results = run([int(size) for size in args.sizes.split(',')], args.cases.split(','))
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            slower = regressions(results, json.load(baseline_file), args.threshold)
+
+        for name, size, reference, seconds in slower:
+            print('Regression: {} at {} bytes {:.6f}s -> {:.6f}s (+{:.0%})'.format(name, size, reference, seconds, seconds / reference - 1))
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    args = get_args()
+    main(args)
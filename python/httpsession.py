@@ -0,0 +1,38 @@
+# Shared requests session with connection pooling, keep-alive and retries
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Constants
+POOL_SIZE = 10
+RETRIES = 5
+BACKOFF = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+TIMEOUT = 30    # seconds to connect or wait for data before a request is retried, unless the caller sets its own
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    # Default timeout of the requests sent without one, a stalled connection fails and is retried instead of hanging
+    def __init__(self, *args, timeout=TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=self.timeout if timeout is None else timeout, **kwargs)
+
+
+def pooled_session(pool_size=POOL_SIZE, retries=RETRIES, backoff=BACKOFF, timeout=TIMEOUT):
+    # Retry 429/5xx responses with an exponential backoff, Retry-After takes precedence when sent
+    retry = Retry(total=retries,
+                  backoff_factor=backoff,
+                  status_forcelist=RETRY_STATUS,
+                  respect_retry_after_header=True,
+                  raise_on_status=False)
+
+    # Keep up to pool_size connections alive per host
+    adapter = TimeoutHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry, timeout=timeout)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
@@ -0,0 +1,380 @@
+# Module to benchmark offboarding.py and iamstatus.py against local stand-in Google, Slack, Kolide, GitHub and 1Password services
+import argparse
+import contextlib
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import resource
+import stat
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlparse
+
+import yaml
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery_cache import get_static_doc
+
+# Constants
+SIZES = (10, 100, 1000, 10000)
+TOOLS = ('offboarding', 'iamstatus')
+LATENCY = 0.02      # seconds added to every request
+ERROR_RATE = 0.0    # share of the requests answered with a 503
+RATE_LIMIT = 0      # requests per second per service before a 429, 0 for no limit
+RETRY_AFTER = 1     # seconds sent with a 429, urllib3 only accepts whole seconds
+AUDIT_DAYS = 365    # offboarding audit period, the issues are closed within it
+BOUNDARY = 'batch_bench'
+STATE_FILE = 'bench-state.json'   # offboarding checkpoint of the incremental runs
+OP_STUB = '''#!{python}
+# Stand-in 1Password CLI generated by iam_bench.py
+import hashlib, json, random, shutil, sys, time
+
+args = [arg for arg in sys.argv[1:] if not arg.startswith('--session')]
+with open({calls!r}, 'a') as calls:
+    calls.write('.')
+time.sleep({latency})
+
+if args[:2] == ['get', 'document']:
+    shutil.copy({token!r}, args[args.index('--output') + 1])
+elif args[:2] == ['get', 'item']:
+    print(json.dumps({{'uuid': args[2], 'details': {{'notesPlain': 'bench', 'password': 'bench'}}}}))
+elif args[:2] == ['get', 'user'] and random.random() >= {error_rate}:
+    state = ('A', 'S', None)[hashlib.md5(('onepass' + args[2]).encode()).digest()[0] % 3]
+    if not state:
+        sys.exit('[ERROR] user {{!r}} not found'.format(args[2]))
+    print(json.dumps({{'email': args[2], 'state': state}}))
+else:
+    sys.exit('[ERROR] service unavailable')
+'''
+
+
+# Employee addresses made of letters only, as the offboarding issue parser expects
+def employees(count):
+    return ['bench.{}@DOMAIN.com'.format(''.join(chr(ord('a') + int(digit)) for digit in str(index))) for index in range(count)]
+
+
+# Stable account status of an employee on a service
+def status(service, email, statuses):
+    return statuses[hashlib.md5((service + email).encode()).digest()[0] % len(statuses)]
+
+
+class RateLimit:
+
+    # Fixed one second window shared by every connection of a service
+    def __init__(self, rate):
+        self.rate = rate
+        self.window = None
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        if not self.rate:
+            return True
+        with self.lock:
+            window = int(time.monotonic())
+            if window != self.window:
+                self.window, self.count = window, 0
+            self.count += 1
+            return self.count <= self.rate
+
+
+class StandInServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, handler, latency=LATENCY, error_rate=ERROR_RATE, rate_limit=RATE_LIMIT):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server_address[1])
+        self.latency = latency
+        self.error_rate = error_rate
+        self.limit = RateLimit(rate_limit)
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.issues = []
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+
+class StandIn(BaseHTTPRequestHandler):
+
+    # Keep-alive, as the pooled sessions of the tools expect
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.serve(b'')
+
+    def do_POST(self):
+        self.serve(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    # Latency, rate limit and errors apply to every API request before it reaches the route
+    def serve(self, body):
+        url = urlparse(self.path)
+        if url.path.startswith('/discovery/'):
+            return self.route(url.path, {}, body)
+
+        self.server.count('requests')
+        time.sleep(self.server.latency)
+
+        if not self.server.limit.allow():
+            self.server.count('throttled')
+            return self.reply(429, {'error': 'ratelimited'}, {'Retry-After': str(RETRY_AFTER)})
+
+        if random.random() < self.server.error_rate:
+            self.server.count('errors')
+            return self.reply(503, {'error': 'unavailable'})
+
+        self.route(url.path, {key: values[0] for key, values in parse_qs(url.query).items()}, body)
+
+    def reply(self, code, payload, headers=None, content_type='application/json'):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def route(self, path, params, body):
+        self.reply(404, {'error': 'not found'})
+
+
+class SlackAPI(StandIn):
+
+    def route(self, path, params, body):
+        if path != '/api/users.lookupByEmail':
+            return super().route(path, params, body)
+
+        email = params.get('email', '')
+        if status('slack', email, (True, False)):
+            self.reply(200, {'ok': True, 'user': {'profile': {'email': email}}})
+        else:
+            self.reply(200, {'ok': False, 'error': 'users_not_found'})
+
+
+class KolideAPI(StandIn):
+
+    def route(self, path, params, body):
+        if path != '/api/v0/people':
+            return super().route(path, params, body)
+
+        email = params.get('search', '')
+        state = status('kolide', email, ('Active', 'Archived', None))
+        self.reply(200, {'data': [{'email': email, 'status': state}] if state else []})
+
+
+class GitHubAPI(StandIn):
+
+    # Closed offboarding issues of the infrastructure repository, paged with Link headers
+    def route(self, path, params, body):
+        if path != '/repos/ORGANISATION/infrastructure/issues':
+            return super().route(path, params, body)
+
+        issues = self.server.issues
+        perPage = int(params.get('per_page', 30))
+        page = int(params.get('page', 1))
+        lastPage = max(1, -(-len(issues) // perPage))
+
+        links = []
+        for rel, number in (('next', page + 1), ('last', lastPage)):
+            if page < lastPage:
+                links.append('<{}{}?{}>; rel="{}"'.format(self.server.url, path, urlencode(dict(params, page=number)), rel))
+
+        self.reply(200, issues[(page - 1) * perPage:page * perPage], {'Link': ', '.join(links)} if links else None)
+
+
+class GoogleAPI(StandIn):
+
+    # Directory API: discovery document, users.get and multipart batches of users.get.
+    # The discovery document stands for the one bundled with the client, so it is served without latency or errors.
+    def route(self, path, params, body):
+        if path == '/discovery/admin/directory_v1':
+            return self.reply(200, self.server.discovery)
+
+        if path.startswith('/admin/directory/v1/users/'):
+            code, payload = self.user(path)
+            return self.reply(code, payload)
+
+        if path == '/batch':
+            return self.reply(200, self.batch(body), content_type='multipart/mixed; boundary=' + BOUNDARY)
+
+        super().route(path, params, body)
+
+    def user(self, path):
+        email = unquote(urlparse(path).path.rsplit('/', 1)[-1])
+        state = status('google', email, ('active', 'suspended', None))
+        if not state:
+            return 404, {'error': {'code': 404, 'message': 'Resource Not Found: userKey'}}
+        return 200, {'primaryEmail': email, 'suspended': state == 'suspended', 'lastLoginTime': '2026-01-01T00:00:00.000Z'}
+
+    def batch(self, body):
+        request = BytesParser().parsebytes(b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + body)
+        parts = []
+
+        for part in request.get_payload():
+            method, path = part.get_payload().split(' ', 2)[:2]
+            code, payload = self.user(path)
+            parts.append('--{}\r\nContent-Type: application/http\r\nContent-ID: <response-{}>\r\n\r\n'
+                         'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n\r\n{}\r\n'.format(
+                             BOUNDARY, part['Content-ID'][1:-1], code, 'OK' if code == 200 else 'Not Found', json.dumps(payload)))
+
+        return (''.join(parts) + '--{}--\r\n'.format(BOUNDARY)).encode()
+
+
+# Start one stand-in server per service, each on its own port and thread
+def start_services(latency=LATENCY, error_rate=ERROR_RATE, rate_limit=RATE_LIMIT):
+    services = {name: StandInServer(handler, latency, error_rate, rate_limit)
+                for name, handler in (('github', GitHubAPI), ('google', GoogleAPI), ('slack', SlackAPI), ('kolide', KolideAPI))}
+
+    # The bundled discovery document, with every call sent to the stand-in
+    discovery = json.loads(get_static_doc('admin', 'directory_v1'))
+    discovery.update({'rootUrl': services['google'].url + '/', 'mtlsRootUrl': services['google'].url + '/'})
+    services['google'].discovery = discovery
+
+    for server in services.values():
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return services
+
+
+# Write the stand-in 'op' CLI in bin/ of the working directory, with the token it hands out as token.pickle
+def install_op(directory, latency=LATENCY, error_rate=ERROR_RATE):
+    token = os.path.join(directory, 'bench-token.pickle')
+    with open(token, 'wb') as tokenFile:
+        pickle.dump(Credentials(token='bench'), tokenFile)
+
+    os.makedirs(os.path.join(directory, 'bin'), exist_ok=True)
+    stub = os.path.join(directory, 'bin', 'op')
+    with open(stub, 'w') as stubFile:
+        stubFile.write(OP_STUB.format(python=sys.executable, calls=os.path.join(directory, 'op-calls'),
+                                      token=token, latency=latency, error_rate=error_rate))
+    os.chmod(stub, os.stat(stub).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ['PATH'] = os.path.join(directory, 'bin') + os.pathsep + os.environ['PATH']
+
+
+# Run one tool end to end in a fresh process, so the peak memory is its own.
+# offboarding skips the CMDB lookup, which greps a local clone of the infrastructure repository.
+def run_tool(tool, urls, directory, concurrentPages, incremental, results):
+    os.chdir(directory)
+    module = importlib.import_module(tool)
+    for name, url in urls.items():
+        if hasattr(module, name):
+            setattr(module, name, url)
+
+    if tool == 'offboarding':
+        args = argparse.Namespace(startDate=f'{date.today() - timedelta(days=AUDIT_DAYS):%Y%m%d}', endDate=None, concurrentPages=concurrentPages,
+                                  incremental=incremental, state=os.path.join(directory, STATE_FILE), noCMDB=True)
+    else:
+        args = argparse.Namespace(file='users.yaml', google=True, slack=True, onepass=True)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        module.main(args)
+        elapsed = time.perf_counter() - start
+
+    results.put({'seconds': elapsed, 'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+
+
+# Spawn run_tool and wait for its result
+def spawn(context, *args):
+    queue = context.Queue()
+    process = context.Process(target=run_tool, args=args + (queue,))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def benchmark(tools, sizes, latency=LATENCY, error_rate=ERROR_RATE, rate_limit=RATE_LIMIT, concurrentPages=False, incremental=False):
+    directory = tempfile.mkdtemp(prefix='iam_bench_')
+    services = start_services(latency, error_rate, rate_limit)
+    install_op(directory, latency, error_rate)
+    os.environ['OP_TOKEN'] = 'bench'
+    os.environ['NO_PROXY'] = ','.join(filter(None, (os.environ.get('NO_PROXY'), '127.0.0.1')))
+
+    urls = {'GITHUB_API': services['github'].url,
+            'SLACK_API': services['slack'].url + '/api',
+            'KOLIDE_API': services['kolide'].url + '/api/v0',
+            'GOOGLE_DISCOVERY': services['google'].url + '/discovery/admin/directory_v1'}
+    context = multiprocessing.get_context('spawn')
+    results = []
+
+    print('{:<12} {:>9} {:>9} {:>9} {:>9} {:>9} {:>7} {:>9}'.format('tool', 'employees', 'seconds', 'requests', 'req/s', 'throttled', 'errors', 'peak MB'))
+    for tool in tools:
+        for count in sizes:
+            emails = employees(count)
+            closed = [f'{date.today() - timedelta(days=1 + index % (AUDIT_DAYS - 1)):%Y-%m-%d}T12:00:00Z' for index in range(count)]
+            services['github'].issues = [{'number': index + 1, 'body': 'Offboarding of ' + email, 'closed_at': closedAt}
+                                         for index, (email, closedAt) in enumerate(zip(emails, closed))]
+            with open(os.path.join(directory, 'users.yaml'), 'w') as usersFile:
+                yaml.dump({email: None for email in emails}, usersFile)
+
+            # An incremental audit is timed against the checkpoint of a full audit of the same departures
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(directory, STATE_FILE))
+            if tool == 'offboarding' and incremental:
+                spawn(context, tool, urls, directory, concurrentPages, True)
+
+            for server in services.values():
+                server.counts.clear()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(directory, 'op-calls'))
+
+            result = spawn(context, tool, urls, directory, concurrentPages, incremental)
+
+            counts = sum((server.counts for server in services.values()), Counter())
+            with contextlib.suppress(FileNotFoundError):
+                counts['requests'] += os.path.getsize(os.path.join(directory, 'op-calls'))
+
+            result.update({'tool': tool, 'employees': count, 'requests': counts['requests'],
+                           'requests_per_sec': counts['requests'] / result['seconds'],
+                           'throttled': counts['throttled'], 'errors': counts['errors']})
+            results.append(result)
+            print('{tool:<12} {employees:>9} {seconds:>9.2f} {requests:>9} {requests_per_sec:>9.1f} {throttled:>9} {errors:>7} {peak_mb:>9.1f}'.format(**result))
+
+    for server in services.values():
+        server.shutdown()
+    return results
+
+
+def get_args():
+    parser = argparse.ArgumentParser(prog="iam_bench",
+                                     description="Benchmark offboarding.py and iamstatus.py against local stand-in services and a stand-in op CLI")
+    parser.add_argument('--tools', action='store', default=','.join(TOOLS), help='comma separated tools [Default: all]')
+    parser.add_argument('--sizes', action='store', default=','.join(str(size) for size in SIZES), help='comma separated employee counts')
+    parser.add_argument('--latency', action='store', type=float, default=LATENCY, help='seconds added to every request [Default {}]'.format(LATENCY))
+    parser.add_argument('--error-rate', action='store', type=float, default=ERROR_RATE, help='share of the requests failing with a 503', dest='error_rate')
+    parser.add_argument('--rate-limit', action='store', type=int, default=RATE_LIMIT, help='requests per second per service before a 429 [Default: no limit]', dest='rate_limit')
+    parser.add_argument('--concurrent-pages', action='store_true', default=False, help='fetch the GitHub issues pages concurrently', dest='concurrent_pages')
+    parser.add_argument('--incremental', action='store_true', default=False, help='time offboarding incremental audits against the checkpoint of a full one')
+    parser.add_argument('--save', action='store', help='save the results to a JSON file')
+
+    return parser.parse_args()
+
+
+def main(args):
+    results = benchmark(args.tools.split(','), [int(size) for size in args.sizes.split(',')],
+                        args.latency, args.error_rate, args.rate_limit, args.concurrent_pages, args.incremental)
+
+    if args.save:
+        with open(args.save, 'w') as resultsFile:
+            json.dump(results, resultsFile, indent=4)
+
+
+if __name__ == '__main__':
+    args = get_args()
+    main(args)
@@ -6,15 +6,20 @@ import json
 import os
 import pickle
 
-import requests
 import yaml
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-from onepass import OnePass
+from googleapiclient.errors import HttpError
+from httpsession import pooled_session
+from onepass import OnePass, OnePassError
 
 # Constant
 OP = OnePass(session_token=os.getenv('OP_TOKEN'))
+BATCH_SIZE = 100   # Google Directory API batch request limit
+HTTP = pooled_session()
+SLACK_API = 'https://slack.com/api'
+GOOGLE_DISCOVERY = None   # Directory API discovery document URL, None for the one bundled with the client
 
 
 def title(name):
@@ -23,6 +28,21 @@ def title(name):
     print('{:_^50}'.format(''))
 
 
+# Print the employees whose lookup failed, their status is unknown
+def print_unknown(employees):
+    if employees:
+        print('\n- Unknown status, lookup failed (' + str(len(employees)) + ')')
+        for employee in employees:
+            print(employee)
+
+
+# Google Directory API client, built from GOOGLE_DISCOVERY when set
+def directory_client(creds):
+    if GOOGLE_DISCOVERY:
+        return build('admin', 'directory_v1', credentials=creds, discoveryServiceUrl=GOOGLE_DISCOVERY, static_discovery=False, cache_discovery=False)
+    return build('admin', 'directory_v1', credentials=creds)
+
+
 class GoogleAccount:
 
     def __init__(self, dict):
@@ -54,33 +74,55 @@ class GoogleAccount:
                 pickle.dump(creds, open('token.pickle', 'wb'))
                 OP.add_file('token.pickle')
 
-        # Google user lookup account status lookup
-        directory = build('admin', 'directory_v1', credentials=creds)
+        # Google user lookup account status lookup, BATCH_SIZE users per HTTP round trip.
+        # Only a 404 means the account is deleted, any other error leaves its status unknown.
+        directory = directory_client(creds)
         googleActive = []
         googleSuspended = []
         googleDeleted = []
+        googleUnknown = []
 
-        for employee in self.dict.keys():
+        employees = list(self.dict.keys())
+        results = {}
+
+        def callback(requestId, response, exception):
+            if exception is None or (isinstance(exception, HttpError) and exception.resp.status == 404):
+                results[requestId] = response
+            else:
+                results[requestId] = exception
+
+        for start in range(0, len(employees), BATCH_SIZE):
+            batch = directory.new_batch_http_request(callback=callback)
+            for index in range(start, min(start + BATCH_SIZE, len(employees))):
+                batch.add(directory.users().get(userKey=employees[index]), request_id=str(index))
             try:
-                result = directory.users().get(userKey=employee).execute()
-                if result['suspended'] == False:
-                    googleActive.append(employee)
-                else:
-                    googleSuspended.append(employee)
-            except:
+                batch.execute()
+            except Exception as error:
+                results.update({str(index): error for index in range(start, min(start + BATCH_SIZE, len(employees)))})
+
+        for index, employee in enumerate(employees):
+            result = results.get(str(index))
+            if isinstance(result, Exception):
+                googleUnknown.append(employee)
+                print('Google lookup failed for ' + employee + ': ' + str(result))
+            elif result is None:
                 googleDeleted.append(employee)
+            elif result['suspended'] == False:
+                googleActive.append(employee)
+            else:
+                googleSuspended.append(employee)
         try:
             os.remove('token.pickle')
             os.remove('credentials.json')
         except Exception:
             pass
 
-        return googleActive, googleSuspended, googleDeleted
+        return googleActive, googleSuspended, googleDeleted, googleUnknown
 
     # Print Google user accounts status
     def print_status(self, tulpe):
 
-        title('Google' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2])) + ')')
+        title('Google' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2]) + len(tulpe[3])) + ')')
         print('\n- Active account(s) (' + str(len(tulpe[0])) + ')')
         for employee in tulpe[0]:
             print(employee)
@@ -94,6 +136,8 @@ class GoogleAccount:
             for employee in tulpe[2]:
                 print(employee)
 
+        print_unknown(tulpe[3])
+
 
 class SlackAccount:
 
@@ -106,24 +150,33 @@ class SlackAccount:
         slackToken = OP.get_note('slackToken')
         slackActive = []
         slackDeleted = []
+        slackUnknown = []
 
         for employee in self.dict.keys():
-            url = 'https://slack.com/api/users.lookupByEmail'
+            url = SLACK_API + '/users.lookupByEmail'
             slackHeaders = {'Accept': 'application/x-www-form-urlencoded'}
-            response = requests.request('GET', url, headers=slackHeaders, params={'token': slackToken, 'email': employee}).json()
+            try:
+                response = HTTP.request('GET', url, headers=slackHeaders, params={'token': slackToken, 'email': employee}).json()
+            except Exception as error:
+                response = {'ok': False, 'error': str(error)}
 
-            if response['ok'] == True:
+            if response.get('ok') == True:
                 slackActive.append(employee)
 
-            else:
+            # Only users_not_found means deleted, any other error (e.g. ratelimited) leaves the status unknown
+            elif response.get('error') == 'users_not_found':
                 slackDeleted.append(employee)
 
-        return slackActive, slackDeleted
+            else:
+                slackUnknown.append(employee)
+                print('Slack lookup failed for ' + employee + ': ' + str(response.get('error')))
+
+        return slackActive, slackDeleted, slackUnknown
 
     # Print Slack user account status
     def print_status(self, tulpe):
 
-        title('Slack' + ' (' + str(len(tulpe[0]) + len(tulpe[1])) + ')')
+        title('Slack' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2])) + ')')
         print('\n- Active account(s) (' + str(len(tulpe[0])) + ')')
         for employee in tulpe[0]:
             print(employee)
@@ -132,6 +185,8 @@ class SlackAccount:
         for employee in tulpe[1]:
             print(employee)
 
+        print_unknown(tulpe[2])
+
 
 class OnePasswordAccount:
 
@@ -144,25 +199,29 @@ class OnePasswordAccount:
         onepassActive = []
         onepassSuspended = []
         onepassDeleted = []
+        onepassUnknown = []
 
-        for employee in self.dict.keys():
-            try:
-                account = OP.get_user(employee)
+        # None means op did not find the user, a OnePassError any other op failure
+        for employee, account in OP.get_users(self.dict.keys()).items():
+            if account is None:
+                onepassDeleted.append(employee)
 
-                if account['state'] == 'A':
-                    onepassActive.append(employee)
+            elif isinstance(account, OnePassError):
+                onepassUnknown.append(employee)
+                print('1Password lookup failed for ' + employee + ': ' + str(account))
 
-                if account['state'] == 'S':
-                    onepassSuspended.append(employee)
-            except:
-                onepassDeleted.append(employee)
+            elif account['state'] == 'A':
+                onepassActive.append(employee)
 
-        return onepassActive, onepassSuspended, onepassDeleted
+            elif account['state'] == 'S':
+                onepassSuspended.append(employee)
+
+        return onepassActive, onepassSuspended, onepassDeleted, onepassUnknown
 
     # Print 1Password user account status
     def print_status(self, tulpe):
 
-        title('1Password' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2])) + ')')
+        title('1Password' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2]) + len(tulpe[3])) + ')')
         print('\n- Active account(s) (' + str(len(tulpe[0])) + ')')
         for employee in tulpe[0]:
             print(employee)
@@ -175,6 +234,8 @@ class OnePasswordAccount:
         for employee in tulpe[2]:
             print(employee)
 
+        print_unknown(tulpe[3])
+
 
 class CLI:
     # Options for argument parser
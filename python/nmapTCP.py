@@ -1,42 +1,284 @@
 # Module for a nmap TCP ports scan of known hosts
+import argparse
+import glob
+import json
 import logging
 import multiprocessing
 import os
+import re
 import shlex
 import subprocess
+import time
 from datetime import datetime
+from xml.etree.ElementTree import ParseError
+
+import nmapreport
 
 TIMESTAMP = datetime.now().strftime("%Y-%m-%d_%H:%M")
+CHUNK_HOSTS = 64    # target lines per scan job
+PORT_SLICES = 4     # port ranges per target chunk
+MAX_PORT = 65535
+BASELINE_DIR = 'baseline'   # open ports per DC from previous scans
+DELTA_SLICES = 16           # a delta scan covers the known open ports and 1/DELTA_SLICES of the range
+STATS_EVERY = '10s'         # nmap progress output interval
+METRICS = "nmap_metrics_{}.jsonl".format(TIMESTAMP)
+
+
+# Append a metrics record to the JSON lines log
+def write_metrics(record):
+    record = dict(record, time=datetime.now().isoformat(timespec='seconds'))
+    with open(METRICS, 'a') as metrics_file:
+        metrics_file.write(json.dumps(record) + '\n')
+
+
+# Seconds of a nmap H:MM:SS duration
+def seconds(duration):
+    hours, minutes, secs = (int(part) for part in duration.split(':'))
+    return hours * 3600 + minutes * 60 + secs
+
+
+# Number of ports of a nmap -p specification
+def port_count(ports):
+    count = 0
+    for part in ports.split(','):
+        first, _, last = part.partition('-')
+        count += int(last or first) - int(first) + 1
+    return count
+
+
+class Progress:
+
+    # Parse the nmap --stats-every output of a job into metrics records
+    def __init__(self, dc, chunk, ports):
+        self.record = {'dc': dc, 'chunk': chunk, 'ports': port_count(ports), 'hosts_up': 0, 'hosts_completed': 0}
+
+    def __call__(self, line):
+        stats = re.search(r'Stats: (\d+:\d+:\d+) elapsed; (\d+) hosts completed \((\d+) up\)', line)
+        if stats:
+            self.record.update({'elapsed': seconds(stats.group(1)),
+                                'hosts_completed': int(stats.group(2)),
+                                'hosts_up': int(stats.group(3))})
+            return
+
+        timing = re.search(r'About ([\d.]+)% done.*\((\d+:\d+:\d+) remaining\)', line)
+        if timing and self.record.get('elapsed'):
+            elapsed = self.record['elapsed']
+            percent = float(timing.group(1))
+            self.record.update({'percent': percent,
+                                'eta': seconds(timing.group(2)),
+                                'hosts_per_sec': round(self.record['hosts_completed'] / elapsed, 2),
+                                # connect() probes, estimated from the completion of the job
+                                'probes_per_sec': round(self.record['hosts_up'] * self.record['ports'] * percent / 100 / elapsed)})
+            write_metrics(self.record)
+            logging.info("Job %s/%s: %s%% done, %s hosts/s, ETA %ss", self.record['dc'], self.record['chunk'],
+                         percent, self.record['hosts_per_sec'], self.record['eta'])
 
 
 class Scanner:
 
-    # Execute bash command
-    def exec_cmd(self, cmd_str):
+    # Execute bash command, every output line is passed to on_line as it comes
+    def exec_cmd(self, cmd_str, on_line=None):
         args = shlex.split(cmd_str)
-        pipe = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        out, err = pipe.communicate()
+        pipe = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        for line in pipe.stdout:
+            if on_line:
+                on_line(line)
+        pipe.wait()
         os.system('stty sane')
+        return pipe.returncode
+
+    # nmap TCP ports scan of one chunk of a DC, returns the DC, the partial XML file and the nmap return code
+    def port_scan_tcp(self, job):
+        dc, chunk, targets, ports = job
+        logging.info("Job %s/%s: starting nmap scan of ports %s", dc, chunk, ports)
+        progress = Progress(dc, chunk, ports)
+        start = time.monotonic()
+        returncode = self.exec_cmd("nmap -n -Pn -sT -p {} -T4 --min-rate 10000 --initial-rtt-timeout 100ms --min-rtt-timeout 200ms --max-rtt-timeout 400ms --max-retries 2 --min-hostgroup 100 --stats-every {} -oX {}_tcp_{}_{}.xml -iL {}".format(ports, STATS_EVERY, dc, TIMESTAMP, chunk, targets), progress)
+        write_metrics(dict(progress.record, elapsed=round(time.monotonic() - start, 1), percent=100, eta=0, returncode=returncode))
+        logging.info("Job %s/%s: nmap scan completed", dc, chunk)
+        return dc, "{}_tcp_{}_{}.xml".format(dc, TIMESTAMP, chunk), returncode
+
+
+# Split the port range in slices as (first, last) tuples
+def port_ranges(slices):
+    step = -(-MAX_PORT // slices)
+    return [(start, min(start + step - 1, MAX_PORT)) for start in range(1, MAX_PORT + 1, step)]
+
+
+# Ports of a delta scan: the known open ports and the rotating slice of the range
+def delta_ports(baseline):
+    first, last = port_ranges(DELTA_SLICES)[baseline['slice'] % DELTA_SLICES]
+    known = sorted({port for ports in baseline['hosts'].values() for port in ports if not first <= port <= last})
+    spec = ','.join([str(port) for port in known] + ["{}-{}".format(first, last)])
+    return spec, set(known) | set(range(first, last + 1))
+
+
+# Split the DC target lists in host chunks and port ranges, one scan job each.
+# In delta mode each chunk is scanned once with the DC delta ports.
+def scan_jobs(dcs, chunk_hosts=CHUNK_HOSTS, port_slices=PORT_SLICES, baselines=None):
+    ranges = ["{}-{}".format(first, last) for first, last in port_ranges(port_slices)]
+    jobs = []
+
+    for dc in dcs:
+        if baselines:
+            ranges = [delta_ports(baselines[dc])[0]]
+
+        with open("dc/{}.txt".format(dc)) as dc_file:
+            targets = [line.strip() for line in dc_file if line.strip() and not line.startswith('#')]
+
+        for index in range(0, len(targets), chunk_hosts):
+            targets_file = "{}_tcp_{}_{}.txt".format(dc, TIMESTAMP, index // chunk_hosts)
+            with open(targets_file, 'w') as chunk_file:
+                chunk_file.write('\n'.join(targets[index:index + chunk_hosts]) + '\n')
+
+            for part, ports in enumerate(ranges):
+                jobs.append((dc, "{}_{}".format(index // chunk_hosts, part), targets_file, ports))
+
+    return jobs
 
-    # nmap TCP ports scan
-    def port_scan_tcp(self, dc):
-        logging.info("Thread %s: starting nmap scan", dc)
-        self.exec_cmd("nmap -n -Pn -sT -p- -T4 --min-rate 10000 --initial-rtt-timeout 100ms --min-rtt-timeout 200ms --max-rtt-timeout 400ms --max-retries 2 --min-hostgroup 100 -oX {}_tcp_{}.xml -iL dc/{}.txt".format(dc, TIMESTAMP, dc))
-        self.exec_cmd("xsltproc {}_tcp_{}.xml -o {}_tcp_{}.html".format(dc, TIMESTAMP, dc, TIMESTAMP))
-        self.exec_cmd("rm {}_tcp_{}.xml".format(dc, TIMESTAMP))
-        logging.info("Thread %s: nmap scan completed", dc)
 
+# Records of the partial XML files of a DC, a ParseError names the file it comes from
+def partial_records(partials):
+    for partial in partials:
+        try:
+            yield from nmapreport.records(partial)
+        except ParseError as error:
+            raise ParseError("{}: {}".format(partial, error))
 
-def main():
+
+# Collect the open TCP ports per host address while passing the records through
+def open_ports(records, hosts):
+    for record in records:
+        ports = hosts.setdefault(record['address'], [])
+        if record['protocol'] == 'tcp' and record['state'] == 'open':
+            ports.append(record['port'])
+        yield record
+
+
+def load_baseline(dc):
+    try:
+        with open(os.path.join(BASELINE_DIR, "{}.json".format(dc))) as baseline_file:
+            return json.load(baseline_file)
+    except FileNotFoundError:
+        return {'hosts': {}, 'slice': 0}
+
+
+def save_baseline(dc, baseline):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(os.path.join(BASELINE_DIR, "{}.json".format(dc)), 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=4)
+
+
+# Newly opened and closed ports per host against the baseline, limited to the scanned ports
+def compare(baseline, results, scanned=None):
+    changes = {}
+    for address in sorted(set(baseline['hosts']) | set(results)):
+        before = {port for port in baseline['hosts'].get(address, []) if scanned is None or port in scanned}
+        after = set(results.get(address, []))
+        if before != after:
+            changes[address] = {'opened': sorted(after - before), 'closed': sorted(before - after)}
+    return changes
+
+
+# Compare the open ports of a DC scan with its baseline, save the changes and update the baseline
+def update_baseline(dc, results, delta):
+    baseline = load_baseline(dc)
+    results = {address: sorted(set(ports)) for address, ports in results.items()}
+    scanned = delta_ports(baseline)[1] if delta else None
+    changes = compare(baseline, results, scanned)
+
+    for address, change in changes.items():
+        logging.info("DC %s: %s opened %s closed %s", dc, address, change['opened'], change['closed'])
+    with open("{}_tcp_{}_delta.json".format(dc, TIMESTAMP), 'w') as delta_file:
+        json.dump(changes, delta_file, indent=4)
+
+    if delta:
+        hosts = {address: sorted({port for port in ports if port not in scanned} | set(results.get(address, [])))
+                 for address, ports in baseline['hosts'].items()}
+        hosts.update({address: ports for address, ports in results.items() if address not in hosts})
+        baseline = {'hosts': hosts, 'slice': baseline['slice'] + 1}
+    else:
+        baseline = {'hosts': results, 'slice': baseline['slice']}
+    save_baseline(dc, baseline)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(prog="nmapTCP",
+                                     description="nmap TCP ports scan of the hosts listed in dc/<name>.txt")
+    parser.add_argument('--dc', action='append', help='DC to scan, can be repeated [Default: every dc/*.txt]')
+    parser.add_argument('--chunk-hosts', action='store', type=int, default=CHUNK_HOSTS, help='target lines per scan job', dest='chunk_hosts')
+    parser.add_argument('--port-slices', action='store', type=int, default=PORT_SLICES, help='port ranges per target chunk', dest='port_slices')
+    parser.add_argument('--delta', action='store_true', default=False, help='only scan the baseline open ports and a rotating slice of the port range')
+    parser.add_argument('--formats', action='store', default='html', help='comma separated report formats among {} [Default: html]'.format(', '.join(nmapreport.REPORTS)))
+    parser.add_argument('--processes', action='store', type=int, default=os.cpu_count(), help='scan jobs run at once [Default: CPU count]')
+
+    # An unknown report format fails before any scan job runs
+    args = parser.parse_args()
+    unknown = [format for format in args.formats.split(',') if format not in nmapreport.REPORTS]
+    if unknown:
+        parser.error("unknown report format(s) {}, choose among {}".format(', '.join(unknown), ', '.join(nmapreport.REPORTS)))
+
+    return args
+
+
+def main(args):
     format = "%(asctime)s: %(message)s"
     logging.basicConfig(format=format, level=logging.INFO, datefmt="%H:%M:%S")
-    DCs = ('dc1', 'dc2', 'dc3', 'dc4')
+    DCs = args.dc or sorted(os.path.splitext(os.path.basename(path))[0] for path in glob.glob('dc/*.txt'))
     posture = Scanner()
-    logging.info("Starting scan")
-    with multiprocessing.Pool(processes=4) as pool:
-        pool.map(posture.port_scan_tcp, DCs)
+    baselines = {dc: load_baseline(dc) for dc in DCs} if args.delta else None
+    jobs = scan_jobs(DCs, args.chunk_hosts, args.port_slices, baselines)
+    total = {dc: sum(1 for job in jobs if job[0] == dc) for dc in DCs}
+    remaining = dict(total)
+    start = time.monotonic()
+    partials = {dc: [] for dc in DCs}
+    failures = {dc: [] for dc in DCs}
+    logging.info("Starting scan: %s jobs over %s processes", len(jobs), args.processes)
+
+    formats = args.formats.split(',')
+
+    # Jobs of every DC share one queue, a DC is reported as soon as its last job completes
+    with multiprocessing.Pool(processes=args.processes) as pool:
+        for dc, partial, returncode in pool.imap_unordered(posture.port_scan_tcp, jobs):
+            partials[dc].append(partial)
+            remaining[dc] -= 1
+            if returncode != 0:
+                failures[dc].append("{} (nmap exit status {})".format(partial, returncode))
+
+            # Per DC progress, the ETA assumes the remaining jobs take as long as the completed ones
+            elapsed = time.monotonic() - start
+            done = total[dc] - remaining[dc]
+            write_metrics({'dc': dc, 'jobs_done': done, 'jobs_total': total[dc], 'elapsed': round(elapsed, 1),
+                           'eta': round(elapsed / done * remaining[dc], 1)})
+            logging.info("DC %s: %s/%s jobs done in %ss", dc, done, total[dc], round(elapsed))
+
+            if not remaining[dc]:
+                failures[dc] += ["{} (missing)".format(partial) for partial in partials[dc] if not os.path.exists(partial)]
+                partials[dc] = sorted(partial for partial in partials[dc] if os.path.exists(partial))
+                results = {}
+                records = open_ports(partial_records(partials[dc]), results)
+                try:
+                    count = nmapreport.write_reports(records, "{}_tcp_{}".format(dc, TIMESTAMP), formats)
+                except ParseError as error:
+                    count = None
+                    failures[dc].append("unparsable XML {}".format(error))
+
+                # A failed job leaves the ports of its hosts unknown, the baseline is only updated from complete scans
+                # and the partial XML files of a failed scan are kept for inspection
+                if failures[dc]:
+                    logging.error("DC %s: scan failed, report incomplete and baseline not updated: %s", dc, ', '.join(failures[dc]))
+                else:
+                    update_baseline(dc, results, args.delta)
+                    for scan_file in partials[dc]:
+                        os.remove(scan_file)
+                    logging.info("DC %s: scan completed, %s ports reported", dc, count)
+
+                for scan_file in glob.glob("{}_tcp_{}_*.txt".format(dc, TIMESTAMP)):
+                    os.remove(scan_file)
+
     logging.info("All DC scans completed.")
 
 
 if __name__ == "__main__":
-    main()
+    args = get_args()
+    main(args)
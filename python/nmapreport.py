@@ -0,0 +1,107 @@
+# Module to stream nmap XML results as port records and render HTML, JSON and CSV reports
+import csv
+import html
+import json
+import xml.etree.ElementTree as ET
+
+# Constants
+FIELDS = ('address', 'hostname', 'protocol', 'port', 'state', 'reason', 'service', 'product', 'version')
+FORMATS = ('html', 'json', 'csv')
+
+
+# Yield one record per scanned port, parsed hosts are dropped so memory stays constant
+def records(xml_file):
+    root = None
+
+    for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+
+        if elem.tag != 'host':
+            continue
+
+        address = elem.find('address').get('addr')
+        hostname = elem.find('hostnames/hostname')
+
+        for port in elem.iterfind('ports/port'):
+            state = port.find('state')
+            service = port.find('service')
+            yield {'address': address,
+                   'hostname': hostname.get('name') if hostname is not None else '',
+                   'protocol': port.get('protocol'),
+                   'port': int(port.get('portid')),
+                   'state': state.get('state') if state is not None else '',
+                   'reason': state.get('reason', '') if state is not None else '',
+                   'service': service.get('name', '') if service is not None else '',
+                   'product': service.get('product', '') if service is not None else '',
+                   'version': service.get('version', '') if service is not None else ''}
+
+        root.clear()
+
+
+class HTMLReport:
+
+    def __init__(self, path, title):
+        self.file = open(path, 'w')
+        self.file.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{0}</title></head><body>\n'
+                        '<h1>{0}</h1>\n<table border="1">\n<tr>{1}</tr>\n'.format(
+                            html.escape(title), ''.join('<th>{}</th>'.format(field) for field in FIELDS)))
+
+    def write(self, record):
+        self.file.write('<tr>{}</tr>\n'.format(''.join('<td>{}</td>'.format(html.escape(str(record[field]))) for field in FIELDS)))
+
+    def close(self):
+        self.file.write('</table>\n</body></html>\n')
+        self.file.close()
+
+
+class JSONReport:
+
+    def __init__(self, path, title):
+        self.file = open(path, 'w')
+        self.file.write('[')
+        self.first = True
+
+    def write(self, record):
+        self.file.write(('\n' if self.first else ',\n') + json.dumps(record))
+        self.first = False
+
+    def close(self):
+        self.file.write('\n]\n')
+        self.file.close()
+
+
+class CSVReport:
+
+    def __init__(self, path, title):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+        self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(record)
+
+    def close(self):
+        self.file.close()
+
+
+REPORTS = {'html': HTMLReport, 'json': JSONReport, 'csv': CSVReport}
+
+
+# Write every record to the <basename>.<format> reports as it comes, return the number of records
+def write_reports(records, basename, formats=FORMATS):
+    reports = [REPORTS[format]('{}.{}'.format(basename, format), basename) for format in formats]
+    count = 0
+
+    try:
+        for record in records:
+            for report in reports:
+                report.write(record)
+            count += 1
+    finally:
+        for report in reports:
+            report.close()
+
+    return count
@@ -8,17 +8,31 @@ import pickle
 import platform
 import re
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
+from itertools import chain
+from queue import Queue
+from threading import Thread
+from urllib.parse import parse_qs, urlparse
 
-import requests
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-from onepass import OnePass
+from googleapiclient.errors import HttpError
+from httpsession import pooled_session
+from onepass import OnePass, OnePassError
 
-Constant
+# Constants
 OP = OnePass(session_token=os.getenv('OP_TOKEN'))
 OSPLATFORM = platform.system()
+WORKERS = {'github': 4, 'cmdb': 4, 'google': 4, 'slack': 4, 'kolide': 4, 'onepass': 4}   # per-provider concurrency limits
+BATCH_SIZE = 100   # Google Directory API batch request limit
+STATE_FILE = 'offboarding-state.json'   # incremental audit checkpoint
+HTTP = pooled_session(pool_size=max(WORKERS.values()))
+GITHUB_API = 'https://api.github.com'
+SLACK_API = 'https://slack.com/api'
+KOLIDE_API = 'https://k2.kolide.com/api/v0'
+GOOGLE_DISCOVERY = None   # Directory API discovery document URL, None for the one bundled with the client
 
 
 def date_converter(date, format):
@@ -32,11 +46,48 @@ def title(name):
     print('{:_^50}'.format(''))
 
 
+# Print the employees whose lookup failed, their status is unknown
+def print_unknown(employees):
+    if employees:
+        print('\n- Unknown status, lookup failed (' + str(len(employees)) + ')')
+        for employee in employees:
+            print(employee)
+
+
+# Run a lookup for every employee on a bounded thread pool as (employee, result) pairs in the employees order.
+# Employees can be a stream, every lookup starts as soon as its employee arrives.
+def concurrent_lookup(function, employees, workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(employee, executor.submit(function, employee)) for employee in employees]
+        return [(employee, future.result()) for employee, future in futures]
+
+
+# Split an iterable in lists of a given size, each one yielded as soon as it is full
+def chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Google Directory API client, built from GOOGLE_DISCOVERY when set
+def directory_client(creds):
+    if GOOGLE_DISCOVERY:
+        return build('admin', 'directory_v1', credentials=creds, discoveryServiceUrl=GOOGLE_DISCOVERY, static_discovery=False, cache_discovery=False)
+    return build('admin', 'directory_v1', credentials=creds)
+
+
 class Offboarded:
 
-    def __init__(self, startDate, endDate):
+    def __init__(self, startDate, endDate, concurrentPages=False):
         self.startDate = startDate
         self.endDate = endDate
+        self.concurrentPages = concurrentPages
+        self.sinceDate = startDate
 
     # Date validation
     def date_validation(self):
@@ -76,51 +127,59 @@ class Offboarded:
             print(f'\nFrom {dateStart:%Y-%m-%d} to {date.today()}')
             print('{:_^50}'.format(''), end='\n')
 
-    # Source of truth
-    def github_offboarding(self):
-
-        def offboarding_list(string, dictionary, date, number):
-            try:
-                email = re.search('([a-z]{1,30}|\.){1,7}@(DOMAIN.com)', str(string))
-                dictionary.update({email.group(): date})
-            except:
-                print('No email found in issue #' + str(number))
-
-        def date_converter(date, format):
-            datetimeObj = datetime.strptime(date, format)
-            return datetimeObj
+    # Stream closed offboarding issues page by page, following the Link headers
+    def github_issues(self):
 
-        dateStart = date_converter(self.startDate + 'T00:00:00Z', '%Y%m%dT%H:%M:%SZ')
+        dateStart = date_converter(self.sinceDate + 'T00:00:00Z', '%Y%m%dT%H:%M:%SZ')
         githubToken = OP.get_note('githubToken')
         owner = 'ORGANISATION'
         repo = 'infrastructure'
-        url = f'https://api.github.com/repos/{owner}/{repo}/issues'
+        url = f'{GITHUB_API}/repos/{owner}/{repo}/issues'
         githubHeaders = {'Accept': 'application/vnd.github.v3+json', 'Authorization': f'token {githubToken}'}
-        response = requests.request('GET', url, headers=githubHeaders, params={'state': 'closed',
-                                                                               'labels': 'offboarding',
-                                                                               'since': f'{dateStart:%Y-%m-%d}T00:00:00Z',
-                                                                               'per_page': 100}).json()
-        if not response:
-            print('No employee offboarded in the specified date')
-            exit()
-
-        offboardedList = {}
-        for issue in response:
+        githubParams = {'state': 'closed',
+                        'labels': 'offboarding',
+                        'since': f'{dateStart:%Y-%m-%d}T00:00:00Z',
+                        'per_page': 100}
+
+        response = HTTP.request('GET', url, headers=githubHeaders, params=githubParams)
+        yield from response.json()
+
+        # Once the last page number is known, the remaining pages can be fetched at once
+        if self.concurrentPages and 'last' in response.links:
+            lastPage = int(parse_qs(urlparse(response.links['last']['url']).query)['page'][0])
+
+            def page(number):
+                return HTTP.request('GET', url, headers=githubHeaders, params=dict(githubParams, page=number)).json()
+
+            with ThreadPoolExecutor(max_workers=WORKERS['github']) as executor:
+                for issues in executor.map(page, range(2, lastPage + 1)):
+                    yield from issues
+
+        else:
+            while 'next' in response.links:
+                response = HTTP.request('GET', response.links['next']['url'], headers=githubHeaders)
+                yield from response.json()
+
+    # Stream offboarded employees as (email, issue closing date) within the audit period
+    def offboarded_stream(self):
+
+        dateStart = date_converter(self.startDate + 'T00:00:00Z', '%Y%m%dT%H:%M:%SZ')
+        if self.endDate:
+            dateEnd = date_converter(self.endDate + 'T00:00:00Z', '%Y%m%dT%H:%M:%SZ')
+
+        for issue in self.github_issues():
             if 'pull_request' in issue:
-                pass
-            else:
-                createdDate = date_converter(issue['created_at'], '%Y-%m-%dT%H:%M:%SZ')
-                closedDate = date_converter(issue['closed_at'], '%Y-%m-%dT%H:%M:%SZ')
+                continue
 
-                if self.endDate:
-                    dateEnd = date_converter(self.endDate + 'T00:00:00Z', '%Y%m%dT%H:%M:%SZ')
-                    if dateStart.date() <= closedDate.date() <= dateEnd.date():
-                        offboarding_list(issue['body'], offboardedList, issue['closed_at'], issue['number'])
-                else:
-                    if dateStart.date() <= closedDate.date():
-                        offboarding_list(issue['body'], offboardedList, issue['closed_at'], issue['number'])
+            closedDate = date_converter(issue['closed_at'], '%Y-%m-%dT%H:%M:%SZ')
+            if dateStart.date() > closedDate.date() or (self.endDate and closedDate.date() > dateEnd.date()):
+                continue
 
-        return offboardedList
+            email = re.search('([a-z]{1,30}|\.){1,7}@(DOMAIN.com)', str(issue['body']))
+            if email:
+                yield email.group(), issue['closed_at']
+            else:
+                print('No email found in issue #' + str(issue['number']))
 
     # Print offboarded employees
     def print_offboarding(self, dictionary):
@@ -134,24 +193,68 @@ class Offboarded:
         return dictionary
 
 
+class DepartureStream:
+
+    # Broadcast the departures of a stream to every provider as the GitHub pages arrive,
+    # and keep them as a {email: issue closing date} dict for the report
+    def __init__(self, stream, consumers):
+        self.departures = {}
+        self.error = None
+        self.queues = [Queue() for _ in range(consumers)]
+        self.thread = Thread(target=self.__read, args=(stream,), daemon=True)
+        self.thread.start()
+
+    def __read(self, stream):
+        try:
+            for employee, closedAt in stream:
+                if employee not in self.departures:
+                    for queue in self.queues:
+                        queue.put(employee)
+                self.departures.update({employee: closedAt})
+        except Exception as error:
+            self.error = error
+        finally:
+            for queue in self.queues:
+                queue.put(None)
+
+    # Employees of one consumer, ends with the stream
+    def consumer(self, index):
+        while True:
+            employee = self.queues[index].get()
+            if employee is None:
+                return
+            yield employee
+
+    # Wait for the end of the stream, raise its error if any
+    def result(self):
+        self.thread.join()
+        if self.error:
+            raise self.error
+        return self.departures
+
+
 class CMDB:
 
-    def __init__(self, dict):
+    def __init__(self, dict, workers=WORKERS['cmdb']):
         self.dict = dict
+        self.workers = workers
 
     # CMDB account status lookup
     def account_status(self):
 
-        infraActive = {}
-        for employee in self.dict.keys():
+        def lookup(employee):
             name = employee.replace('@DOMAIN.com', '')
             audit = subprocess.run(['ack', '--match',  '^' + name + '$|' + employee, os.getenv('HOME')+'/COMPANY/infrastructure'], stdout=subprocess.PIPE)
 
             if not audit.stdout.decode('utf-8'):
-                pass
+                return None
             else:
-                filesLines = subprocess.run(['cut', '-d', ':', '-f', '1-2'], stdout=subprocess.PIPE, input=audit.stdout).stdout.decode('utf-8')
-                infraActive.update({name: filesLines})
+                return subprocess.run(['cut', '-d', ':', '-f', '1-2'], stdout=subprocess.PIPE, input=audit.stdout).stdout.decode('utf-8')
+
+        infraActive = {}
+        for employee, filesLines in concurrent_lookup(lookup, self.dict, self.workers):
+            if filesLines:
+                infraActive.update({employee.replace('@DOMAIN.com', ''): filesLines})
 
         return infraActive
 
@@ -170,12 +273,23 @@ class CMDB:
 
 class GoogleOrg:
 
-    def __init__(self, dict):
+    name = 'google'
+    statuses = ('active', 'suspended', 'deleted', 'unknown')
+
+    def __init__(self, dict, workers=WORKERS['google']):
         self.dict = dict
+        self.workers = workers
 
     # Google account status lookup
     def account_status(self):
 
+        # Nothing to check, skip the OAuth flow. Otherwise wait for the first employee of a stream.
+        employees = iter(self.dict)
+        first = next(employees, None)
+        if first is None:
+            return {}, [], [], []
+        employees = chain([first], employees)
+
         # Google OAuth authentication flow
         scopes = ['https://www.googleapis.com/auth/admin.directory.user.readonly',
                   'https://www.googleapis.com/auth/admin.directory.user.alias.readonly']
@@ -199,33 +313,57 @@ class GoogleOrg:
                 pickle.dump(creds, open('token.pickle', 'wb'))
                 OP.add_file('token.pickle')
 
-        # Google lookup
-        directory = build('admin', 'directory_v1', credentials=creds)
+        # Google lookup, one batch HTTP request per chunk of employees.
+        # Each chunk builds its own directory client as httplib2 is not thread-safe.
+        # A result is the user, None when Google answers 404, or the error of a failed lookup.
+        def lookup(employees):
+            results = [None] * len(employees)
+
+            def callback(requestId, response, exception):
+                if exception is None or (isinstance(exception, HttpError) and exception.resp.status == 404):
+                    results[int(requestId)] = response
+                else:
+                    results[int(requestId)] = exception
+
+            try:
+                directory = directory_client(creds)
+                batch = directory.new_batch_http_request(callback=callback)
+                for index, employee in enumerate(employees):
+                    batch.add(directory.users().get(userKey=employee), request_id=str(index))
+                batch.execute()
+            except Exception as error:
+                return [error] * len(employees)
+
+            return results
+
         googleActive = {}
         googleSuspended = []
         googleDeleted = []
-
-        for employee in self.dict.keys():
-            try:
-                result = directory.users().get(userKey=employee).execute()
-                if result['suspended'] == False:
-                    googleActive.update({employee: result['lastLoginTime']})
-                else:
-                    googleSuspended.append(employee)
-            except:
+        googleUnknown = []
+
+        batches = concurrent_lookup(lookup, chunks(employees, BATCH_SIZE), self.workers)
+        for employee, result in ((employee, result) for batch, results in batches for employee, result in zip(batch, results)):
+            if isinstance(result, Exception):
+                googleUnknown.append(employee)
+                print(f'Google lookup failed for {employee}: {result}')
+            elif result is None:
                 googleDeleted.append(employee)
+            elif result['suspended'] == False:
+                googleActive.update({employee: result['lastLoginTime']})
+            else:
+                googleSuspended.append(employee)
         try:
             os.remove('token.pickle')
             os.remove('credentials.json')
         except Exception:
             pass
 
-        return googleActive, googleSuspended, googleDeleted
+        return googleActive, googleSuspended, googleDeleted, googleUnknown
 
     # Print Google account status
     def print_status(self, tulpe):
 
-        title('Google' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2])) + ')')
+        title('Google' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2]) + len(tulpe[3])) + ')')
         print('\n- Active account(s) (' + str(len(tulpe[0].keys())) + ')' + ': last login')
         for employee in tulpe[0].keys():
             lastLogin = date_converter(tulpe[0][employee], '%Y-%m-%dT%H:%M:%S.%fZ')
@@ -240,11 +378,17 @@ class GoogleOrg:
             for employee in tulpe[2]:
                 print(employee)
 
+        print_unknown(tulpe[3])
+
 
 class SlackOrg:
 
-    def __init__(self, dict):
+    name = 'slack'
+    statuses = ('active', 'deleted', 'unknown')
+
+    def __init__(self, dict, workers=WORKERS['slack']):
         self.dict = dict
+        self.workers = workers
 
     # Slack account status lookup
     def account_status(self):
@@ -252,24 +396,35 @@ class SlackOrg:
         slackToken = OP.get_note('slackToken')
         slackActive = []
         slackDeleted = []
+        slackUnknown = []
 
-        for employee in self.dict.keys():
-            url = 'https://slack.com/api/users.lookupByEmail'
+        def lookup(employee):
+            url = SLACK_API + '/users.lookupByEmail'
             slackHeaders = {'Accept': 'application/x-www-form-urlencoded'}
-            response = requests.request('GET', url, headers=slackHeaders, params={'token': slackToken, 'email': employee}).json()
+            try:
+                return HTTP.request('GET', url, headers=slackHeaders, params={'token': slackToken, 'email': employee}).json()
+            except Exception as error:
+                return {'ok': False, 'error': str(error)}
+
+        # Only users_not_found means deleted, any other error (e.g. ratelimited) leaves the status unknown
+        for employee, response in concurrent_lookup(lookup, self.dict, self.workers):
 
-            if response['ok'] == True:
+            if response.get('ok') == True:
                 slackActive.append(employee)
 
-            else:
+            elif response.get('error') == 'users_not_found':
                 slackDeleted.append(employee)
 
-        return slackActive, slackDeleted
+            else:
+                slackUnknown.append(employee)
+                print(f"Slack lookup failed for {employee}: {response.get('error')}")
+
+        return slackActive, slackDeleted, slackUnknown
 
     # Print Slack account status
     def print_status(self, tulpe):
 
-        title('Slack' + ' (' + str(len(tulpe[0]) + len(tulpe[1])) + ')')
+        title('Slack' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2])) + ')')
         print('\n- Active account(s) (' + str(len(tulpe[0])) + ')')
         for employee in tulpe[0]:
             print(employee)
@@ -278,11 +433,17 @@ class SlackOrg:
         for employee in tulpe[1]:
             print(employee)
 
+        print_unknown(tulpe[2])
+
 
 class KolideOrg:
 
-    def __init__(self, dict):
+    name = 'kolide'
+    statuses = ('active', 'archived', 'deleted', 'unknown')
+
+    def __init__(self, dict, workers=WORKERS['kolide']):
         self.dict = dict
+        self.workers = workers
 
     # Kolide account status lookup
     def account_status(self):
@@ -291,13 +452,24 @@ class KolideOrg:
         kolideActive = []
         kolideArchived = []
         kolideDeleted = []
+        kolideUnknown = []
 
-        for employee in self.dict.keys():
-            url = 'https://k2.kolide.com/api/v0/people'
+        def lookup(employee):
+            url = KOLIDE_API + '/people'
             slackHeaders = {'Accept': 'application/json', 'Authorization': f'Bearer {kolideToken}'}
-            response = requests.request('GET', url, headers=slackHeaders, params={'search': employee}).json()
+            try:
+                return HTTP.request('GET', url, headers=slackHeaders, params={'search': employee}).json()
+            except Exception as error:
+                return {'error': str(error)}
+
+        # Only an empty search result means deleted, an error response leaves the status unknown
+        for employee, response in concurrent_lookup(lookup, self.dict, self.workers):
+
+            if 'data' not in response:
+                kolideUnknown.append(employee)
+                print(f"Kolide lookup failed for {employee}: {response.get('error', response)}")
 
-            if response['data']:
+            elif response['data']:
                 for profile in response['data']:
 
                     if profile['status'] == 'Active':
@@ -308,12 +480,12 @@ class KolideOrg:
             else:
                 kolideDeleted.append(employee)
 
-        return kolideActive, kolideArchived, kolideDeleted
+        return kolideActive, kolideArchived, kolideDeleted, kolideUnknown
 
     # Print Kolide account status
     def print_status(self, tulpe):
 
-        title('Kolide' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2])) + ')')
+        title('Kolide' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2]) + len(tulpe[3])) + ')')
         print('\n- Active profile(s) (' + str(len(tulpe[0])) + ')')
         for employee in tulpe[0]:
             print(employee)
@@ -327,11 +499,17 @@ class KolideOrg:
             for employee in tulpe[2]:
                 print(employee)
 
+        print_unknown(tulpe[3])
+
 
 class OnePasswordOrg:
 
-    def __init__(self, dict):
+    name = 'onepass'
+    statuses = ('active', 'suspended', 'deleted', 'unknown')
+
+    def __init__(self, dict, workers=WORKERS['onepass']):
         self.dict = dict
+        self.workers = workers
 
     # 1Password account status lookup
     def account_status(self):
@@ -339,25 +517,29 @@ class OnePasswordOrg:
         onepassActive = []
         onepassSuspended = []
         onepassDeleted = []
+        onepassUnknown = []
 
-        for employee in self.dict.keys():
-            try:
-                account = OP.get_user(employee)
+        # None means op did not find the user, a OnePassError any other op failure
+        for employee, account in OP.get_users(self.dict, workers=self.workers).items():
+            if account is None:
+                onepassDeleted.append(employee)
 
-                if account['state'] == 'A':
-                    onepassActive.append(employee)
+            elif isinstance(account, OnePassError):
+                onepassUnknown.append(employee)
+                print(f'1Password lookup failed for {employee}: {account}')
 
-                if account['state'] == 'S':
-                    onepassSuspended.append(employee)
-            except:
-                onepassDeleted.append(employee)
+            elif account['state'] == 'A':
+                onepassActive.append(employee)
 
-        return onepassActive, onepassSuspended, onepassDeleted
+            elif account['state'] == 'S':
+                onepassSuspended.append(employee)
+
+        return onepassActive, onepassSuspended, onepassDeleted, onepassUnknown
 
     # Print 1Password account status
     def print_status(self, tulpe):
 
-        title('1Password' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2])) + ')')
+        title('1Password' + ' (' + str(len(tulpe[0]) + len(tulpe[1]) + len(tulpe[2]) + len(tulpe[3])) + ')')
         print('\n- Active account(s) (' + str(len(tulpe[0])) + ')')
         for employee in tulpe[0]:
             print(employee)
@@ -370,6 +552,64 @@ class OnePasswordOrg:
         for employee in tulpe[2]:
             print(employee)
 
+        print_unknown(tulpe[3])
+
+
+class Checkpoint:
+
+    def __init__(self, path):
+        self.path = path
+        self.lastClosedAt = None
+        self.employees = {}
+
+        if os.path.exists(path):
+            with open(path) as stateFile:
+                state = json.load(stateFile)
+            self.lastClosedAt = state['lastClosedAt']
+            self.employees = state['employees']
+
+    # Only query GitHub for issues closed since the last run
+    def since(self, startDate):
+        if not self.lastClosedAt:
+            return startDate
+        lastClosed = date_converter(self.lastClosedAt, '%Y-%m-%dT%H:%M:%SZ')
+        return max(startDate, f'{lastClosed:%Y%m%d}')
+
+    # Departures already known within the audit period
+    def departures(self, startDate, endDate):
+        known = {}
+        for employee, state in self.employees.items():
+            closedDate = f"{date_converter(state['closedAt'], '%Y-%m-%dT%H:%M:%SZ'):%Y%m%d}"
+            if startDate <= closedDate and (not endDate or closedDate <= endDate):
+                known.update({employee: state['closedAt']})
+        return known
+
+    # Employees a provider still has to check: new departures and accounts not confirmed deleted yet.
+    # A failed lookup is recorded as 'unknown', so the account is checked again on the next run.
+    def pending(self, provider, employees):
+        return (employee for employee in employees if self.employees.get(employee, {}).get(provider) != 'deleted')
+
+    # Record the statuses returned by a provider and add back the accounts already deleted, which were skipped
+    def update(self, provider, result, departures):
+        deleted = [employee for employee in departures if self.employees.get(employee, {}).get(provider.name) == 'deleted']
+
+        for status, employees in zip(provider.statuses, result):
+            for employee in employees:
+                self.employees.setdefault(employee, {}).update({provider.name: status})
+
+        result[provider.statuses.index('deleted')].extend(deleted)
+        return result
+
+    # Save the checkpoint
+    def save(self, departures):
+        for employee, closedAt in departures.items():
+            self.employees.setdefault(employee, {}).update({'closedAt': closedAt})
+            if not self.lastClosedAt or closedAt > self.lastClosedAt:
+                self.lastClosedAt = closedAt
+
+        with open(self.path, 'w') as stateFile:
+            json.dump({'lastClosedAt': self.lastClosedAt, 'employees': self.employees}, stateFile, indent=4)
+
 
 # Instantiate argument parser
 def get_args():
@@ -384,6 +624,10 @@ def get_args():
 
     accounts.add_argument('-s', '--startDate', action='store', type=str, help='start data of the audit period formated as YYYYMMDD')
     accounts.add_argument('-e', '--endDate', action='store', type=str, required=False, help='end date of the audit period formated as YYYYMMDD', metavar='')
+    accounts.add_argument('-p', '--concurrentPages', action='store_true', required=False, help='fetch the GitHub issues pages concurrently')
+    accounts.add_argument('-i', '--incremental', action='store_true', required=False, help='only re-check new departures and accounts not deleted yet')
+    accounts.add_argument('--state', action='store', type=str, required=False, default=STATE_FILE, help='incremental audit checkpoint file', metavar='')
+    accounts.add_argument('--noCMDB', action='store_true', required=False, help='skip the lookup in the local clone of the infrastructure repository')
 
     return accounts.parse_args()
 
@@ -391,26 +635,55 @@ def get_args():
 # Run program
 def main(args):
 
-    if not os.path.exists('/usr/bin/ack') and not os.path.exists('/usr/local/bin/ack'):
+    if not args.noCMDB and not os.path.exists('/usr/bin/ack') and not os.path.exists('/usr/local/bin/ack'):
         print("offboarding.py requires the tool 'ack'. Download it from your package manager and retry this script.")
 
-    offboarding = Offboarded(args.startDate, args.endDate)
+    offboarding = Offboarded(args.startDate, args.endDate, args.concurrentPages)
     offboarding.date_validation()
-    departures = offboarding.github_offboarding()
 
-    cmdb = CMDB(departures)
-    google = GoogleOrg(departures)
-    slack = SlackOrg(departures)
-    kolide = KolideOrg(departures)
-    onepass = OnePasswordOrg(departures)
+    # Incremental audit: the known departures of the period, then the new ones since the checkpoint
+    if args.incremental:
+        checkpoint = Checkpoint(args.state)
+        offboarding.sinceDate = checkpoint.since(args.startDate)
+        stream = chain(checkpoint.departures(args.startDate, args.endDate).items(), offboarding.offboarded_stream())
+    else:
+        checkpoint = None
+        stream = offboarding.offboarded_stream()
+
+    # Providers start their lookups as the GitHub pages arrive, instead of waiting for the whole issue list.
+    # They only look up the employees pending in the checkpoint, if any.
+    orgs = (GoogleOrg, SlackOrg, KolideOrg, OnePasswordOrg)
+    stream = DepartureStream(stream, len(orgs) if args.noCMDB else len(orgs) + 1)
+
+    def org(provider, index):
+        if checkpoint:
+            return provider(checkpoint.pending(provider.name, stream.consumer(index)))
+        return provider(stream.consumer(index))
+
+    providers = [org(provider, index) for index, provider in enumerate(orgs)]
+    cmdb = None if args.noCMDB else CMDB(stream.consumer(len(orgs)))
+    if cmdb:
+        providers.insert(0, cmdb)
+
+    # Fan out every provider at once, print in a fixed order once all lookups are done
+    with ThreadPoolExecutor(max_workers=len(providers)) as executor:
+        statuses = [executor.submit(provider.account_status) for provider in providers]
+
+    departures = stream.result()
+    if not departures:
+        print('No employee offboarded in the specified date')
+        exit()
 
     offboarding.header()
     offboarding.print_offboarding(departures)
-    cmdb.print_status(cmdb.account_status())
-    google.print_status(google.account_status())
-    slack.print_status(slack.account_status())
-    kolide.print_status(kolide.account_status())
-    onepass.print_status(onepass.account_status())
+    for provider, status in zip(providers, statuses):
+        result = status.result()
+        if checkpoint and provider is not cmdb:
+            result = checkpoint.update(provider, result, departures)
+        provider.print_status(result)
+
+    if checkpoint:
+        checkpoint.save(departures)
 
 
 if __name__ == '__main__':
@@ -2,23 +2,46 @@
 
 import json
 import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from getpass import getpass
 from subprocess import run
+from threading import Lock
 
 # Constants
 OP_CLI = "op"
 USERNAME = 0
 PASSWORD = 1
+CACHE_TTL = 300    # seconds an item stays cached
+CACHE_SIZE = 128   # items kept before evicting the least recently used
+WORKERS = 8        # op processes run at once by the bulk methods
+NOT_FOUND = ("not found", "doesn't seem to be")   # op error messages of a missing item or user
+
+
+class OnePassError(Exception):
+
+    # A failed op command, not_found tells a missing item or user from any other failure
+    def __init__(self, message):
+        super().__init__(message)
+        self.not_found = any(marker in message for marker in NOT_FOUND)
 
 
 class OnePass:
 
-    def __init__(self, session_token=None):
+    def __init__(self, session_token=None, cache_ttl=CACHE_TTL, cache_size=CACHE_SIZE):
         # Set the session token
         if session_token is None:
             session_token = getpass("Enter your 1Password CLI Session Token: ")
         self.__session_token = session_token
 
+        # Decoded 'get item' outputs keyed by UUID, with the names and UUIDs they were requested by as aliases
+        self.__cache_ttl = cache_ttl
+        self.__cache_size = cache_size
+        self.__cache = OrderedDict()
+        self.__aliases = {}
+        self.__cache_lock = Lock()
+
     @staticmethod
     def __run_command(command, text=True, json_output=True):
         # Run the command
@@ -28,6 +51,10 @@ class OnePass:
             capture_output=True
         )
 
+        if result.returncode != 0:
+            stderr = result.stderr if text else result.stderr.decode('utf-8', 'replace')
+            raise OnePassError(stderr.strip() or "op exited with status {}".format(result.returncode))
+
         # Return the output
         if json_output:
             return json.loads(result.stdout)
@@ -72,10 +99,69 @@ class OnePass:
             )
         )
 
+    # Custom method
+    @staticmethod
+    def __run_parallel(function, names, workers):
+        # Run function for every name on a bounded pool, names not found map to None
+        # and names whose command failed otherwise map to the error
+        def fetch(name):
+            try:
+                return function(name)
+            except OnePassError as error:
+                return None if error.not_found else error
+            except Exception as error:
+                return OnePassError(str(error))
+
+        # Names can be a stream, every command starts as soon as its name arrives
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(name, executor.submit(fetch, name)) for name in names]
+            return {name: future.result() for name, future in futures}
+
+    # Custom method
+    def __get_item(self, item_name):
+        # Get an item through the cache, 'op get item' only runs on a miss or an expired entry
+        with self.__cache_lock:
+            uuid = self.__aliases.get(item_name)
+            cached = self.__cache.get(uuid)
+            if cached and cached[0] > time.monotonic():
+                self.__cache.move_to_end(uuid)
+                return cached[1]
+
+        output = self.__run_op_command("get item {}".format(item_name))
+        expiry = time.monotonic() + self.__cache_ttl
+
+        # One entry per item whatever its aliases, the least recently used item is evicted with all of them
+        with self.__cache_lock:
+            uuid = output.get("uuid", item_name)
+            aliases = self.__cache[uuid][2] if uuid in self.__cache else set()
+            aliases.update((item_name, uuid))
+            self.__cache[uuid] = (expiry, output, aliases)
+            self.__cache.move_to_end(uuid)
+            for alias in aliases:
+                self.__aliases[alias] = uuid
+
+            while len(self.__cache) > self.__cache_size:
+                self.__uncache(*self.__cache.popitem(last=False))
+
+        return output
+
+    def __uncache(self, uuid, cached):
+        # Drop the aliases of an item removed from the cache, unless they point to another item since
+        for alias in cached[2]:
+            if self.__aliases.get(alias) == uuid:
+                del self.__aliases[alias]
+
+    # Custom method
+    def clear_cache(self):
+        # Drop every cached item
+        with self.__cache_lock:
+            self.__cache.clear()
+            self.__aliases.clear()
+
     def get_credentials(self, item_name):
         # Get credentials for a specific item
         result = {}
-        output = self.__run_op_command("get item {}".format(item_name))
+        output = self.__get_item(item_name)
 
         result["username"] = str(
             output["details"]["fields"][USERNAME]["value"]
@@ -89,7 +175,7 @@ class OnePass:
     # Custom method
     def get_password(self, item_name):
         # Get the password of a specific item
-        output = self.__run_op_command("get item {}".format(item_name))
+        output = self.__get_item(item_name)
         result = str(
             output["details"]['password']
         )
@@ -101,13 +187,13 @@ class OnePass:
 
     def get_uuid(self, file_name):
         # Get the UUID of a specific item
-        output = self.__run_op_command("get item {}".format(file_name))
+        output = self.__get_item(file_name)
         return output["uuid"]
 
     # Custom method
     def get_note(self, item_name):
         # Get note content of a specific item
-        output = self.__run_op_command("get item {}".format(item_name))
+        output = self.__get_item(item_name)
         result = str(
             output["details"]['notesPlain']
         )
@@ -118,6 +204,13 @@ class OnePass:
         # Add a file in the private vault. Item has the same name has the file.
         result = self.__run_op_command("create document {}".format(file_name))
 
+        # The new document replaces any cached item of that name
+        with self.__cache_lock:
+            uuid = self.__aliases.get(file_name)
+            cached = self.__cache.pop(uuid, None)
+            if cached:
+                self.__uncache(uuid, cached)
+
     # Custom method
     def copy_file(self, file_name):
         # Copy file in your working directory.
@@ -131,7 +224,7 @@ class OnePass:
     # Custom method
     def create_file(self, item_name, file_name):
         # Create file in the working directory.
-        output = self.__run_op_command("get item {}".format(item_name))
+        output = self.__get_item(item_name)
         data = output["details"]['notesPlain']
 
         with open(file_name, 'w') as file:
@@ -155,3 +248,15 @@ class OnePass:
         # Get the details of a user
         output = self.__run_op_command("get user {}".format(user))
         return output
+
+    # Custom method
+    def get_users(self, users, workers=WORKERS):
+        # Get the details of several users as a {user: details} dict, None when the user is not found
+        # and a OnePassError when the lookup failed
+        return self.__run_parallel(self.get_user, users, workers)
+
+    # Custom method
+    def get_items(self, item_names, workers=WORKERS):
+        # Get several items as a {item name: item} dict, None when the item is not found
+        # and a OnePassError when the lookup failed
+        return self.__run_parallel(self.__get_item, item_names, workers)
@@ -0,0 +1,15 @@
+import pytest
+
+from cryptopals import Cryptopals
+
+CRYPTOPALS = Cryptopals()
+
+
+def test_crack_repeating_key_xor_short_input():
+    with pytest.raises(ValueError):
+        CRYPTOPALS.crack_repeating_key_xor(b'ab')
+
+
+def test_detect_single_char_xor_no_ciphertext():
+    with pytest.raises(ValueError):
+        CRYPTOPALS.detect_single_char_xor([])
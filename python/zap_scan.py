@@ -4,63 +4,213 @@ import json
 import os
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
 from time import sleep
+from urllib.parse import urlparse
 
 import progressbar
 import requests
 import yaml
+from httpsession import pooled_session
 from zapv2 import ZAPv2
 
+# Constants
+UNREACHABLE = "ZAP Error [java.net.NoRouteToHostException]: No route to host (Host unreachable)"
+CONCURRENCY = 4      # targets spidered or scanned at once in multi-target mode
+POLL_INTERVAL = 3    # seconds between two status polls of the running scans
+ALERTS_PAGE = 500    # alerts fetched per core.alerts call
+SEO_WORKERS = 16     # URLs checked at once by the SEO migration analysis
+SEO_RATE = 10        # requests per second sent to a same host
+SEO_TIMEOUT = 10     # seconds before a URL check gives up
+SPIDER_MAX_AGE = 24  # hours a checkpointed spider URL set stays fresh
+CHECKPOINT_INTERVAL = 60   # seconds between two checkpoints of a running active scan
+URL_RULES = {
+    'replace': {'ZAP': 'ZAP_SCAN'},                               # substrings replaced in every URL
+    'strip': ['\\?account_name', 'embed'],                        # URL truncated from the first match
+    'exclude': ['wp\\-', '\\.php', '\\.txt', '\\.xml', 'rsd'],    # URL dropped on match
+}
+
+
+class URLFilter:
+    # URL normalization and exclusion rules compiled once in a single matcher
+    def __init__(self, rules=None):
+        rules = dict(URL_RULES, **(rules or {}))
+        self.replacements = rules['replace'] or {}
+        self.replace = re.compile('|'.join(re.escape(old) for old in sorted(self.replacements, key=len, reverse=True))) if self.replacements else None
+
+        # The leftmost match decides: a strip rule truncates the URL, an exclude rule drops it
+        strip = '|'.join(rules['strip'] or []) or '(?!)'
+        exclude = '|'.join(rules['exclude'] or []) or '(?!)'
+        self.matcher = re.compile('(?P<strip>(?:{}).*)|(?P<exclude>{})'.format(strip, exclude), re.DOTALL)
+
+    @classmethod
+    def from_yaml(cls, file):
+        with open(file) as rules_file:
+            return cls(yaml.safe_load(rules_file))
+
+    def normalize(self, url):
+        url = str(url)
+        if self.replace:
+            url = self.replace.sub(lambda match: self.replacements[match.group()], url)
+        return url
+
+    def clean(self, url):
+        # Cleaned URL, None when it is excluded or empty
+        url = self.normalize(url)
+        match = self.matcher.search(url)
+        if match:
+            if match.lastgroup == 'exclude':
+                return None
+            url = url[:match.start()]
+        return url or None
+
+    def filter(self, urls):
+        # Yield the unique cleaned URLs in their first seen order
+        seen = set()
+        for url in urls:
+            url = self.clean(url)
+            if url and url not in seen:
+                seen.add(url)
+                yield url
+
+
+class ScanCheckpoint:
+    # Local state of a scan: spider URLs, active scan id and alerts collected so far (JSON lines next to it)
+    def __init__(self, file, target):
+        self.file = file
+        self.alerts_file = file + '.alerts'
+        self.session = 'zap_scan_' + os.path.splitext(os.path.basename(file))[0]
+        self.state = {'target': target, 'spider': None, 'scan_id': None, 'alerts': 0}
+
+        if os.path.exists(file):
+            with open(file) as checkpoint_file:
+                state = json.load(checkpoint_file)
+            if state['target'] == target:
+                self.state = state
+
+        if not self.state['alerts'] and os.path.exists(self.alerts_file):
+            os.remove(self.alerts_file)
+
+    def save(self, **state):
+        self.state.update(state)
+        with open(self.file + '.tmp', 'w') as checkpoint_file:
+            json.dump(self.state, checkpoint_file)
+        os.replace(self.file + '.tmp', self.file)
+
+    def restart(self, **state):
+        # A new spider starts over: alerts are collected again from the first one.
+        # The state is saved first, a leftover alerts file is dropped on load when the count is 0.
+        self.save(alerts=0, **state)
+        if os.path.exists(self.alerts_file):
+            os.remove(self.alerts_file)
+
+    def urls(self, max_age=SPIDER_MAX_AGE):
+        # Spider URLs when they are fresh enough to skip the spider
+        spider = self.state['spider']
+        if spider and time.time() - spider['time'] < max_age * 3600:
+            return spider['urls']
+        return None
+
+    def add_alerts(self, alerts):
+        count = self.state['alerts']
+        with open(self.alerts_file, 'a') as alerts_file:
+            for alert in alerts:
+                alerts_file.write(json.dumps(alert) + '\n')
+                count += 1
+        self.save(alerts=count)
+
+    def read_alerts(self):
+        if os.path.exists(self.alerts_file):
+            with open(self.alerts_file) as alerts_file:
+                for line in alerts_file:
+                    yield json.loads(line)
+
+
+def zap_scan_id(response):
+    # ZAP answers a spider or scan request with the scan id, or with an error such as url_not_found
+    if not str(response).isdigit():
+        raise ValueError("ZAP error: {}".format(response))
+    return response
+
 
 class ZAP_SCAN:
-    def __init__(self, proxy_port):
+    def __init__(self, proxy_port, url_rules=None):
         self.zap = ZAPv2(apikey=os.environ['ZAPTOKEN'], proxies={'http': 'http://127.0.0.1:{}'.format(proxy_port), 'https': 'https://127.0.0.1:{}'.format(proxy_port)})
+        self.url_filter = URLFilter.from_yaml(url_rules) if url_rules else URLFilter()
 
     def __zap_spider(self, target):
-        scan_id = self.zap.spider.scan(target)
+        scan_id = zap_scan_id(self.zap.spider.scan(target))
 
         bar = progressbar.ProgressBar(maxval=100, widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
         print('\033[1m', "[*] Start spider module ...", '\033[0m')
         bar.start()
-        while int(self.zap.spider.status(scan_id)) < 100:
+        status = int(self.zap.spider.status(scan_id))
+        while status < 100:
             time.sleep(1)
-            bar.update(int(self.zap.spider.status(scan_id)))
+            status = int(self.zap.spider.status(scan_id))
+            bar.update(status)
         bar.finish()
 
-        urls = self.zap.spider.results()
-
-        for i in range(0, len(urls)):
-            url = str(urls[i])
-            if 'ZAP' in url:
-                url = url.replace('ZAP', 'ZAP_SCAN')
-            urls[i] = url
+        return self.spider_urls(scan_id)
 
-        return urls
+    def spider_urls(self, scan_id):
+        return [self.url_filter.normalize(url) for url in self.zap.spider.results(scan_id)]
 
-    def __zap_scanner(self, target):
-        scan_id = self.zap.ascan.scan(target)
+    def __zap_scanner(self, target, scan_id=None, checkpoint=None):
+        # A new scan keeps the alert offset: the daemon still holds, or has reloaded, the alerts already checkpointed
+        if scan_id is None:
+            scan_id = zap_scan_id(self.zap.ascan.scan(target))
+            if checkpoint:
+                checkpoint.save(scan_id=scan_id)
 
         bar = progressbar.ProgressBar(maxval=100, widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
         print('\033[1m', "[*] Start scan module ...", '\033[0m')
         bar.start()
-        while int(self.zap.ascan.status(scan_id)) < 100:
+        status = int(self.zap.ascan.status(scan_id))
+        saved = time.monotonic()
+        while status < 100:
             time.sleep(3)
-            bar.update(int(self.zap.ascan.status(scan_id)))
-        bar.finish()
+            status = int(self.zap.ascan.status(scan_id))
+            bar.update(status)
 
-        alerts = list()
-        for i in self.zap.core.alerts():
-            if 'alert' in i and 'url' in i:
-                alert = str(i['alert'])
-                url = str(i['url'])
-
-                if 'ZAP' in url:
-                    url = url.replace('ZAP', 'ZAP_SCAN')
+            if checkpoint and time.monotonic() - saved > CHECKPOINT_INTERVAL:
+                self.__checkpoint(target, checkpoint)
+                saved = time.monotonic()
+        bar.finish()
 
-                alerts.append(
-                    {
-                        'alert': alert,
-                        'url': url,
+        if checkpoint:
+            self.__checkpoint(target, checkpoint)
+
+        return scan_id
+
+    def __checkpoint(self, target, checkpoint):
+        # Keep the alerts added since the last checkpoint and save the ZAP session
+        checkpoint.add_alerts(self.alerts(target, start=checkpoint.state['alerts']))
+        self.zap.core.save_session(checkpoint.session, overwrite='true')
+
+    def __scan_exists(self, scan_id):
+        # A scan id is unknown after a ZAP daemon restart
+        try:
+            int(self.zap.ascan.status(scan_id))
+            return True
+        except (ValueError, TypeError):
+            return False
+
+    def __has_target(self, target):
+        # The sites of a target are gone after a ZAP daemon restart
+        return urlparse(target).hostname in self.zap.core.hosts
+
+    def alerts(self, target=None, start=0):
+        # Fetch the alerts of the target page by page and yield them one by one
+        while True:
+            page = self.zap.core.alerts(baseurl=target, start=start, count=ALERTS_PAGE)
+
+            for i in page:
+                if 'alert' in i and 'url' in i:
+                    yield {
+                        'alert': str(i['alert']),
+                        'url': self.url_filter.normalize(i['url']),
                         'attack': str(i['attack']),
                         'confidence': str(i['confidence']),
                         'cweid': str(i['cweid']),
@@ -74,64 +224,230 @@ class ZAP_SCAN:
                         'solution': str(i['solution']),
                         'wascid': str(i['wascid'])
                     }
-                )
+
+            if len(page) < ALERTS_PAGE:
+                break
+            start += len(page)
+
+    def scan_results(self, target=None):
+        alerts = list(self.alerts(target))
 
         results = {
             'hosts: ': ', '.join(self.zap.core.hosts),
-            'number_of_vulnerability': str(len(self.zap.core.alerts())),
+            'number_of_vulnerability': str(len(alerts)),
             'results': alerts
         }
 
         return results
 
-    def start_spider_and_scan(self, target):
-        if "ZAP Error [java.net.NoRouteToHostException]: No route to host (Host unreachable)" in self.zap.urlopen(target):
+    def start_spider_and_scan(self, target, output=None, checkpoint=None):
+        if UNREACHABLE in self.zap.urlopen(target):
             return {"error": "Host unreachable"}
 
-        urls = self.__zap_spider(target)
-        results = self.__zap_scanner(target)
+        try:
+            if checkpoint:
+                return self.__resume_spider_and_scan(target, ScanCheckpoint(checkpoint, target), output)
+
+            urls = self.__zap_spider(target)
+            self.__zap_scanner(target)
+        except ValueError as e:
+            print('\033[93m', "[Error] {}: {}".format(target, e), '\033[0m')
+            return {"error": str(e)}
+
+        # Stream the alerts straight to the output file, only the summary stays in memory
+        if output:
+            return save_scan_to_json(', '.join(self.zap.core.hosts), urls, self.alerts(target), output)
+
+        results = self.scan_results(target)
         results['urls'] = urls
 
         return results
 
+    def __resume_spider_and_scan(self, target, checkpoint, output):
+        # Skip the spider when its URLs are fresh, reloading the saved session when the daemon lost the target,
+        # and continue the active scan when the daemon still knows it
+        urls = checkpoint.urls()
+        if urls is not None and not self.__has_target(target):
+            print('\033[1m', "[*] Reload session {} ...".format(checkpoint.session), '\033[0m')
+            self.zap.core.load_session(checkpoint.session)
+            if not self.__has_target(target):
+                print('\033[1m', "[*] Session {} lost, spider again ...".format(checkpoint.session), '\033[0m')
+                urls = None
+
+        if urls is None:
+            urls = self.__zap_spider(target)
+            self.zap.core.save_session(checkpoint.session, overwrite='true')
+            checkpoint.restart(spider={'urls': urls, 'time': time.time()}, scan_id=None)
+        else:
+            print('\033[1m', "[*] Resume with {} checkpointed URLs ...".format(len(urls)), '\033[0m')
+
+        scan_id = checkpoint.state['scan_id']
+        if scan_id is not None and not self.__scan_exists(scan_id):
+            print('\033[1m', "[*] Scan {} lost, scan again ...".format(scan_id), '\033[0m')
+            scan_id = None
+
+        self.__zap_scanner(target, scan_id, checkpoint)
+
+        if output:
+            return save_scan_to_json(', '.join(self.zap.core.hosts), urls, checkpoint.read_alerts(), output)
+
+        alerts = list(checkpoint.read_alerts())
+        return {
+            'hosts: ': ', '.join(self.zap.core.hosts),
+            'number_of_vulnerability': str(len(alerts)),
+            'results': alerts,
+            'urls': urls
+        }
+
     def start_spider(self, target):
-        if "ZAP Error [java.net.NoRouteToHostException]: No route to host (Host unreachable)" in self.zap.urlopen(target):
+        if UNREACHABLE in self.zap.urlopen(target):
             return {"error": "Host unreachable"}
 
-        return {"urls": self.__zap_spider(target)}
+        try:
+            return {"urls": self.__zap_spider(target)}
+        except ValueError as e:
+            print('\033[93m', "[Error] {}: {}".format(target, e), '\033[0m')
+            return {"error": str(e)}
 
     def domain_urls(self, target):
         raw_urls = self.start_spider(target)
-        urls = raw_urls['urls']
-        clean_url = []
-        for urla in urls:
-            ura = re.sub("\?account_name.*", "",  urla)
-            urb = re.sub("embed.*", "",  ura)
-            urc = re.sub(".*wp\-.*", "",  urb)
-            urd = re.sub(".*\.php", "",  urc)
-            ure = re.sub(".*\.txt", "",  urd)
-            urf = re.sub(".*\.xml", "",  ure)
-            url = re.sub(".*rsd", "",  urf)
-            clean_url.append(url)
-        uniq_urls = list(set(filter(None, clean_url)))
-
-        return uniq_urls
-
-    def seo_migration_analysis(self, target):
+        return list(self.url_filter.filter(raw_urls.get('urls', [])))
+
+    @staticmethod
+    def __check_url(session, limiter, url):
+        # HEAD first, GET without downloading the body when the server does not support HEAD
+        try:
+            limiter.wait(url)
+            response = session.head(url, allow_redirects=True, timeout=SEO_TIMEOUT)
+            if response.status_code in (405, 501):
+                limiter.wait(url)
+                response = session.get(url, allow_redirects=True, timeout=SEO_TIMEOUT, stream=True)
+                response.close()
+        except requests.RequestException as e:
+            return {'status': None, 'url': url, 'redirects': [], 'error': str(e)}
+
+        return {'status': response.status_code, 'url': response.url, 'redirects': [r.url for r in response.history]}
+
+    def seo_migration_analysis(self, target, output=None, workers=SEO_WORKERS, rate=SEO_RATE):
         domain_urls = self.domain_urls(target)
-        urlen = len(domain_urls)
         base_url = "https://DOMAIN.com"
         index = base_url.index("KEYWORD")
-        not_found = list()
-        for url in domain_urls:
-            req = requests.get(url, allow_redirects=True)
-            staging_url = "{}{}{}".format(req.url[:index], "SUBDOMAIN.", req.url[index:])
-            staging_req = requests.get(staging_url, allow_redirects=True)
-            print(staging_req.url)
-            if req.status_code == 404:
-                not_found.append(url)
+        session = pooled_session(pool_size=workers)
+        limiter = HostRateLimiter(rate)
+
+        def check(url):
+            production = self.__check_url(session, limiter, url)
+            staging_url = "{}{}{}".format(production['url'][:index], "SUBDOMAIN.", production['url'][index:])
+            return {'url': url, 'production': production, 'staging': self.__check_url(session, limiter, staging_url)}
+
+        # Results are printed, and written as JSON lines to the output file, as soon as they finish
+        results = list()
+        outfile = open(output, 'w') if output else None
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for future in as_completed([executor.submit(check, url) for url in domain_urls]):
+                    result = future.result()
+                    print("{} {} -> {} {}".format(result['production']['status'], result['url'],
+                                                  result['staging']['status'], result['staging']['url']))
+                    if outfile:
+                        outfile.write(json.dumps(result) + '\n')
+                    results.append(result)
+        finally:
+            if outfile:
+                outfile.close()
 
-        return not_found
+        return results
+
+
+class HostRateLimiter:
+    # Space out the requests sent to a same host
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.slots = {}
+        self.lock = Lock()
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.slots.get(host, now))
+            self.slots[host] = slot + self.interval
+        time.sleep(slot - now)
+
+
+class ZAP_FLEET:
+    # Spider and scan several targets at once, spread over one or more ZAP daemons
+    def __init__(self, proxy_ports, concurrency=CONCURRENCY, url_rules=None):
+        self.daemons = [ZAP_SCAN(proxy_port, url_rules) for proxy_port in proxy_ports]
+        self.concurrency = concurrency
+
+    def __start(self, target, daemons, scan):
+        # Start the spider of a target on the least loaded daemon, the daemon slot is taken once it runs
+        daemon = min(self.daemons, key=lambda zap_scan: daemons[zap_scan])
+        if UNREACHABLE in daemon.zap.urlopen(target):
+            return None
+
+        print('\033[1m', "[*] Start spider module on {} ...".format(target), '\033[0m')
+        job = {'daemon': daemon, 'phase': 'spider', 'scan_id': zap_scan_id(daemon.zap.spider.scan(target)), 'scan': scan}
+        daemons[daemon] += 1
+        return job
+
+    def __advance(self, target, job, daemons, results):
+        # Move a job to its next phase once its running scan is complete, return True when it is done
+        daemon = job['daemon']
+
+        if job['phase'] == 'spider':
+            results[target] = {'urls': daemon.spider_urls(job['scan_id'])}
+            if not job['scan']:
+                daemons[daemon] -= 1
+                return True
+
+            print('\033[1m', "[*] Start scan module on {} ...".format(target), '\033[0m')
+            job.update({'phase': 'ascan', 'scan_id': zap_scan_id(daemon.zap.ascan.scan(target))})
+            return False
+
+        results[target].update(daemon.scan_results(target))
+        daemons[daemon] -= 1
+        return True
+
+    def run(self, targets, scan=True):
+        pending = list(targets)
+        daemons = {daemon: 0 for daemon in self.daemons}
+        active = {}
+        results = {}
+
+        while pending or active:
+            while pending and len(active) < self.concurrency:
+                target = pending.pop(0)
+                try:
+                    job = self.__start(target, daemons, scan)
+                except Exception as e:
+                    print('\033[93m', "[Error] {}: {}".format(target, e), '\033[0m')
+                    results[target] = {"error": str(e)}
+                    continue
+
+                if job is None:
+                    results[target] = {"error": "Host unreachable"}
+                else:
+                    active[target] = job
+
+            # One shared poll of every running spider or scan per interval.
+            # A ZAP error only fails its own target: the error is recorded and its daemon slot released.
+            if active:
+                time.sleep(POLL_INTERVAL)
+            for target, job in list(active.items()):
+                module = job['daemon'].zap.spider if job['phase'] == 'spider' else job['daemon'].zap.ascan
+                try:
+                    if int(module.status(job['scan_id'])) >= 100 and self.__advance(target, job, daemons, results):
+                        print('\033[1m', "[*] {} completed".format(target), '\033[0m')
+                        del active[target]
+                except Exception as e:
+                    print('\033[93m', "[Error] {}: {}".format(target, e), '\033[0m')
+                    results[target] = dict(results.get(target, {}), error=str(e))
+                    daemons[job['daemon']] -= 1
+                    del active[target]
+
+        return {target: results[target] for target in targets}
 
 
 def logo():
@@ -163,15 +479,40 @@ def save_to_json(data, file):
         print('\033[93m', e, '\033[0m')
 
 
+def save_scan_to_json(hosts, urls, alerts, file):
+    # Write the alerts as they are fetched, the count comes from the same stream.
+    # The report is written to a temporary file renamed once complete, a failure never leaves a truncated file.
+    count = 0
+    try:
+        with open(file + '.tmp', 'w') as outfile:
+            outfile.write('{{"hosts: ": {}, "urls": {}, "results": ['.format(json.dumps(hosts), json.dumps(urls)))
+            for alert in alerts:
+                outfile.write((', ' if count else '') + json.dumps(alert))
+                count += 1
+            outfile.write('], "number_of_vulnerability": "{}"}}'.format(count))
+        os.replace(file + '.tmp', file)
+    except Exception as e:
+        print('\033[93m', e, '\033[0m')
+        if os.path.exists(file + '.tmp'):
+            os.remove(file + '.tmp')
+        return {"error": str(e)}
+
+    return {'number_of_vulnerability': str(count), 'output': file}
+
+
 def get_args():
     parser = argparse.ArgumentParser(prog="zap_scan",
                                      usage=logo(),
                                      description="This script spider and scan your target whit OWASP-Zap API")
-    parser.add_argument('-u', action='store', help='A target URI', required=True, dest='url')
+    parser.add_argument('-u', action='store', help='A target URI', dest='url')
+    parser.add_argument('-f', action='store', help='A file of target URIs, one per line', dest='targets')
     parser.add_argument('-o', action='store', help='Save output as JSON in a file', dest='output')
     parser.add_argument('--scan', action='store_true', default=False, help='Scan a target', dest='scan')
     parser.add_argument('--spider', action='store_true', default=False, help='Spider a target', dest='spider')
-    parser.add_argument('--port', action='store', type=str, help='ZAP Proxy Port [Default "127.0.0.1:8090"]', dest='proxy_port', default='8090')
+    parser.add_argument('--port', action='store', type=str, help='ZAP Proxy Port, comma separated for several daemons with -f [Default "127.0.0.1:8090"]', dest='proxy_port', default='8090')
+    parser.add_argument('--concurrency', action='store', type=int, default=CONCURRENCY, help='Targets processed at once with -f [Default {}]'.format(CONCURRENCY))
+    parser.add_argument('--rules', action='store', help='YAML file of URL replace/strip/exclude rules', dest='rules')
+    parser.add_argument('--checkpoint', action='store', help='Checkpoint file to resume an interrupted scan', dest='checkpoint')
     parser.add_argument('--seo', action='store_true', default=False, help='Analyse URIs migration')
 
     return parser.parse_args()
@@ -186,16 +527,35 @@ def main(args):
         print('\033[93m', "[Error] Select '--scan' or '--spider' or '--seo'", '\033[0m')
         exit()
 
-    elif args.scan:
-        zap_class = ZAP_SCAN(args.proxy_port)
-        result = zap_class.start_spider_and_scan(args.url)
+    if not args.url and not args.targets:
+        print('\033[93m', "[Error] Select a target with '-u' or a targets file with '-f'", '\033[0m')
+        exit()
+
+    if args.targets and (args.seo or args.checkpoint):
+        print('\033[93m', "[Error] '--seo' and '--checkpoint' only work with a single target, use '-u'", '\033[0m')
+        exit()
+
+    if args.targets and (args.scan or args.spider):
+        with open(args.targets) as targets_file:
+            targets = [line.strip() for line in targets_file if line.strip() and not line.startswith('#')]
+
+        zap_fleet = ZAP_FLEET(args.proxy_port.split(','), args.concurrency, args.rules)
+        result = zap_fleet.run(targets, scan=args.scan)
         if args.output:
             save_to_json(result, args.output)
         else:
             print(json.dumps(result, indent=4))
 
+    elif args.scan:
+        zap_class = ZAP_SCAN(args.proxy_port, args.rules)
+        result = zap_class.start_spider_and_scan(args.url, args.output, args.checkpoint)
+        if args.output and 'error' in result:
+            save_to_json(result, args.output)
+        elif not args.output:
+            print(json.dumps(result, indent=4))
+
     elif args.spider:
-        zap_class = ZAP_SCAN(args.proxy_port)
+        zap_class = ZAP_SCAN(args.proxy_port, args.rules)
         result = zap_class.start_spider(args.url)
         if args.output:
             save_to_json(result, args.output)
@@ -203,13 +563,14 @@ def main(args):
             print(json.dumps(result, indent=4))
 
     elif args.seo:
-        zap_class = ZAP_SCAN(args.proxy_port)
-        broken_urls = zap_class.seo_migration_analysis(args.url)
+        zap_class = ZAP_SCAN(args.proxy_port, args.rules)
+        results = zap_class.seo_migration_analysis(args.url, args.output)
         print("#############")
         print("     404     ")
         print("#############")
-        for url in broken_urls:
-            print(url)
+        for result in results:
+            if result['production']['status'] == 404:
+                print(result['url'])
 
 
 if __name__ == '__main__':